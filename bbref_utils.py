@@ -0,0 +1,372 @@
+import os
+import sys
+from datetime import date
+from html.parser import HTMLParser
+from pathlib import Path
+
+import pandas as pd
+
+import cache_utils
+import fetch_utils
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# League-wide player tables, by the name bbref uses in the page URL
+LEAGUE_TABLES = ['totals', 'per_game', 'per_minute', 'per_poss', 'advanced', 'shooting', 'play-by-play']
+
+
+def player_id_from_href(href):
+    """
+    Get the bbref player id from a player page link
+    Parameters
+    ----------
+    href : String
+        e.g. /players/j/jamesle01.html
+
+    Returns
+    -------
+    The id, e.g. jamesle01
+    """
+    return href.split("/")[-1].replace(".html", "")
+
+
+class TableParser(HTMLParser):
+    """
+    Streaming parser for one basketball-reference stats table. Each row is read once as the HTML goes by, keeping the
+    text of every <td> and the link of the first one, which is all we need from the page.
+    Parameters
+    ----------
+    table_id : String
+        The id of the <table> to read. None reads the first table on the page
+    """
+
+    def __init__(self, table_id=None):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.in_table = False
+        self.done = False
+        self.section = None
+        self.header_rows = []
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.cell_tag = None
+        self.first_link = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table' and not self.in_table:
+            self.in_table = self.table_id is None or dict(attrs).get('id') == self.table_id
+            return
+        if not self.in_table:
+            return
+        if tag in ('thead', 'tbody', 'tfoot'):
+            self.section = tag
+        elif tag == 'tr':
+            self.row = []
+            self.first_link = None
+        elif tag in ('th', 'td') and self.row is not None:
+            self.cell = []
+            self.cell_tag = tag
+            if tag == 'th' and self.section == 'thead':
+                label = dict(attrs).get('aria-label')
+                if label is not None:
+                    self.cell.append(label)
+                    # Ignore the visible text, the label is the column name
+                    self.cell_tag = 'label'
+        elif tag == 'a' and self.cell_tag == 'td' and self.cell is not None and self.first_link is None:
+            # Only a link in the first <td> (the player's name) counts
+            if not any(cell_tag == 'td' for cell_tag, text in self.row):
+                self.first_link = dict(attrs).get('href')
+
+    def handle_data(self, data):
+        if self.cell is not None and self.cell_tag != 'label':
+            self.cell.append(data)
+
+    def handle_endtag(self, tag):
+        if not self.in_table or self.done:
+            return
+        if tag in ('th', 'td') and self.cell is not None:
+            self.row.append((self.cell_tag, ''.join(self.cell).strip() or None))
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            if self.section == 'thead':
+                self.header_rows.append([text for cell_tag, text in self.row])
+            elif self.section == 'tbody':
+                cells = [text for cell_tag, text in self.row if cell_tag == 'td']
+                # Header rows repeated in the body have no <td>, and totals rows (league average, team) have no link
+                if cells and self.first_link is not None:
+                    cells.append(player_id_from_href(self.first_link))
+                    self.rows.append(cells)
+            self.row = None
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.section = None
+        elif tag == 'table':
+            self.in_table = False
+            self.done = True
+
+
+def read_table_lxml(content, table_id=None):
+    doc = lxml.html.fromstring(content)
+    tables = doc.xpath('//table[@id=$id]', id=table_id) if table_id is not None else doc.xpath('//table')
+    if not tables:
+        return [], []
+    table = tables[0]
+
+    header_rows = table.xpath('./thead/tr')
+    header = []
+    if header_rows:
+        header = [th.get('aria-label') or th.text_content().strip() for th in header_rows[-1].xpath('./th')]
+
+    rows = []
+    for tr in table.xpath('./tbody/tr'):
+        tds = tr.xpath('./td')
+        if not tds:
+            continue
+        links = tds[0].xpath('.//a/@href')
+        if not links:
+            continue
+        cells = [td.text_content().strip() or None for td in tds]
+        cells.append(player_id_from_href(links[0]))
+        rows.append(cells)
+    return header, rows
+
+
+def read_table_rows(content, table_id=None):
+    """
+    Get the header and the player rows of a table, using lxml if it is installed
+    Parameters
+    ----------
+    content : bytes or String
+        The page
+    table_id : String
+        The id of the <table> to read. None reads the first table on the page
+
+    Returns
+    -------
+    The column labels of the last header row and a list of rows, each ending with the player's bbref id
+    """
+    if lxml is not None:
+        return read_table_lxml(content, table_id)
+
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    parser = TableParser(table_id)
+    parser.feed(content)
+    parser.close()
+    header = parser.header_rows[-1] if parser.header_rows else []
+    return header, parser.rows
+
+
+def to_typed_column(values):
+    """
+    Turn the text of one column into numbers if every value is a number
+    Parameters
+    ----------
+    values : tuple
+
+    Returns
+    -------
+    A pandas Series
+    """
+    column = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(column, errors='coerce')
+    if numbers.notna().sum() == column.notna().sum():
+        return numbers
+    return column
+
+
+def unique_columns(columns):
+    """
+    Make repeated column labels unique (the shooting and play-by-play tables repeat some under different groups)
+    Parameters
+    ----------
+    columns : list of String
+
+    Returns
+    -------
+    The labels, with .1, .2, ... added to repeats
+    """
+    seen = {}
+    result = []
+    for column in columns:
+        if column in seen:
+            seen[column] += 1
+            result.append(f"{column}.{seen[column]}")
+        else:
+            seen[column] = 0
+            result.append(column)
+    return result
+
+
+def parse_table(content, table_id=None):
+    """
+    Parse a basketball-reference stats table into a typed dataframe
+    Parameters
+    ----------
+    content : bytes or String
+        The page
+    table_id : String
+        The id of the <table> to read. None reads the first table on the page
+
+    Returns
+    -------
+    The dataframe, with one row per player (and team, for traded players) and an id column with the bbref id
+    """
+    header, rows = read_table_rows(content, table_id)
+    # The first header is the rank, which has no <td> in the body
+    columns = unique_columns(header[1:] + ["id"])
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    data = {i: to_typed_column(values) for i, values in enumerate(zip(*rows))}
+    frame = pd.DataFrame(data, columns=range(len(columns)))
+    frame.columns = columns
+    return frame
+
+
+def league_table_url(year, table):
+    """
+    Get the bbref page of a league-wide player table
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    table : String
+        One of LEAGUE_TABLES
+
+    Returns
+    -------
+    The URL, e.g. https://www.basketball-reference.com/leagues/NBA_2024_totals.html for the 2023-24 totals
+    """
+    return f"https://www.basketball-reference.com/leagues/NBA_{year + 1}_{table}.html"
+
+
+def season_finished(year):
+    # The regular season is over by the end of April
+    return date.today() > date(year + 1, 4, 30)
+
+
+def get_league_page(url, finished):
+    """
+    Get a bbref page through the on-disk response cache. Pages of finished seasons never go stale.
+    Parameters
+    ----------
+    url : String
+    finished : bool
+        Whether the season is over
+
+    Returns
+    -------
+    The body of the page as bytes
+    """
+    cache = cache_utils.get_cache()
+    entry = cache.lookup(url)
+    if entry is not None and (entry['fresh'] or finished or cache.offline):
+        return entry['content']
+
+    r = fetch_utils.get(url)
+    r.raise_for_status()
+    cache.put(url, r.content, etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified'))
+    return r.content
+
+
+def league_table_path(year, table):
+    return Path.cwd() / "DataPack" / "BBRef" / "league" / table / f"{year}.parquet"
+
+
+def fetch_league_table(job):
+    """
+    Download, parse and save one (season, table) partition
+    Parameters
+    ----------
+    job : tuple
+        The year the season starts in and the table name
+
+    Returns
+    -------
+    The path of the saved partition
+    """
+    year, table = job
+    frame = parse_table(get_league_page(league_table_url(year, table), season_finished(year)))
+    frame.insert(0, 'season', year)
+
+    path = league_table_path(year, table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so an interrupted crawl never leaves a partition that looks finished
+    partial = path.with_suffix('.partial')
+    frame.to_parquet(partial, index=False)
+    os.replace(partial, path)
+    return path
+
+
+def crawl_league_tables(years, tables=LEAGUE_TABLES, refresh=False, workers=2):
+    """
+    Crawl league-wide player tables for a range of seasons into the partitioned dataset under DataPack/BBRef/league
+    (one file per table and season). The crawl is resumable: partitions already written are skipped, except for the
+    season still in progress. Every request goes through the shared basketball-reference rate controller, so adding
+    workers never breaks bbref's rate limit.
+    Parameters
+    ----------
+    years : list of int
+        The years the seasons start in
+    tables : list of String
+        Any of LEAGUE_TABLES
+    refresh : bool
+        If True, re-parse every partition (pages still come from the cache when they can)
+    workers : int
+        Maximum number of requests in flight at once
+
+    Returns
+    -------
+    A list of the (year, table) partitions that failed
+    """
+    jobs = [(year, table) for year in years for table in tables
+            if refresh or not season_finished(year) or not league_table_path(year, table).is_file()]
+
+    failed = []
+    for job, path, error in fetch_utils.fetch_concurrently(jobs, fetch_league_table, workers=workers):
+        if error is not None:
+            print(f"{job}: {error!r}")
+            failed.append(job)
+        else:
+            print(f"Saved {path}")
+    return failed
+
+
+def load_league_table(table, years=None):
+    """
+    Read a table from the partitioned dataset
+    Parameters
+    ----------
+    table : String
+        One of LEAGUE_TABLES
+    years : list of int
+        The seasons to read. None reads every season that has been crawled
+
+    Returns
+    -------
+    The dataframe, with a season column
+    """
+    directory = Path.cwd() / "DataPack" / "BBRef" / "league" / table
+    if years is None:
+        paths = sorted(directory.glob("*.parquet"))
+    else:
+        paths = [league_table_path(year, table) for year in years]
+    # Seasons don't all have the same columns (e.g. before some stats were tracked), so read them one by one
+    frames = [pd.read_parquet(path) for path in paths if path.is_file()]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    # e.g. python bbref_utils.py 2014 2023 totals advanced
+    first, last = int(sys.argv[1]), int(sys.argv[2])
+    failures = crawl_league_tables(range(first, last + 1), sys.argv[3:] or LEAGUE_TABLES)
+    if failures:
+        print(f"Failed: {failures}. Run the same command again to retry them.")
@@ -0,0 +1,234 @@
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+import fetch_utils
+
+POOL_SIZE = 4
+
+# Requests for these never reach the network. We only ever read the DOM, so images, fonts and ads are wasted time.
+BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*doubleclick.net*', '*googlesyndication.com*', '*googletagmanager.com*', '*google-analytics.com*',
+    '*amazon-adsystem.com*', '*adnxs.com*', '*taboola.com*', '*outbrain.com*', '*scorecardresearch.com*',
+]
+
+
+def headless_options():
+    """
+    Get the Chrome options used by every pooled driver: headless, no images, and usable on a Linux box without a
+    display or a big /dev/shm
+    Returns
+    -------
+    The ChromeOptions object
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    # Some pages only render their tables/charts at desktop widths
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    # Hand the page back once the DOM is ready instead of waiting for every last script and iframe
+    options.page_load_strategy = 'eager'
+    return options
+
+
+def new_driver():
+    """
+    Start a headless Chrome driver that blocks images, fonts and ads
+    Returns
+    -------
+    The webdriver.Chrome object
+    """
+    driver = webdriver.Chrome(options=headless_options())
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+    except WebDriverException:
+        # Blocking is an optimization only
+        pass
+    return driver
+
+
+def is_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+class DriverPool:
+    """
+    Pool of warm headless Chrome drivers shared by every Selenium scraper. Drivers are started the first time they are
+    needed and then reused, so a scrape pays the browser start-up once per driver instead of once per run. A driver
+    that crashed is thrown away and replaced by a fresh one the next time one is needed.
+    Parameters
+    ----------
+    size : int
+        Most drivers open at once
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = max(1, size)
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.drivers = []
+
+    def checkout(self, timeout=None):
+        """
+        Take a driver from the pool, starting a new one if the pool isn't full yet, or waiting for one to be returned
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait for a driver. None waits forever
+
+        Returns
+        -------
+        The webdriver.Chrome object
+        """
+        waited = 0.0
+        while True:
+            try:
+                return self.idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self.lock:
+                start_new = self.created < self.size
+                if start_new:
+                    self.created += 1
+            if start_new:
+                try:
+                    driver = new_driver()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+                with self.lock:
+                    self.drivers.append(driver)
+                return driver
+
+            # Wait for a driver to come back. Poll so that a slot freed by a recycled driver is noticed too.
+            if timeout is not None and waited >= timeout:
+                raise queue.Empty
+            try:
+                return self.idle.get(timeout=0.5)
+            except queue.Empty:
+                waited += 0.5
+
+    def checkin(self, driver):
+        """
+        Give a driver back to the pool. If it crashed, it is closed and its slot freed for a new one.
+        Parameters
+        ----------
+        driver : webdriver.Chrome
+        """
+        if is_alive(driver):
+            self.idle.put(driver)
+        else:
+            self.recycle(driver)
+
+    def recycle(self, driver):
+        quit_driver(driver)
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+                self.created -= 1
+
+    @contextmanager
+    def driver(self):
+        """
+        Borrow a driver for the duration of a with block
+        """
+        driver = self.checkout()
+        try:
+            yield driver
+        finally:
+            self.checkin(driver)
+
+    def map(self, scrape, items, controller=None):
+        """
+        Run scrape(driver, item) for every item, in parallel across the pool
+        Parameters
+        ----------
+        scrape : callable
+            Called with a driver and a single item
+        items : iterable
+            The items (pages, dates, team ids, ...) to scrape
+        controller : AdaptiveRateLimiter
+            If given, every page load first takes a token from it, and it is told whether the scrape succeeded
+
+        Returns
+        -------
+        A generator of (item, result, error) tuples in completion order. error is None when the scrape succeeded.
+        """
+
+        def task(item):
+            if controller is not None:
+                controller.acquire()
+            with self.driver() as driver:
+                try:
+                    result = scrape(driver, item)
+                except Exception:
+                    if controller is not None:
+                        controller.failure()
+                    raise
+            if controller is not None:
+                controller.success()
+            return result
+
+        return fetch_utils.fetch_concurrently(items, task, workers=self.size)
+
+    def close(self):
+        """
+        Quit every driver
+        """
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+            self.created = 0
+        while not self.idle.empty():
+            self.idle.get_nowait()
+        for driver in drivers:
+            quit_driver(driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool(size=POOL_SIZE):
+    """
+    Get the shared driver pool, creating it the first time it is used. The drivers are closed when Python exits.
+    Parameters
+    ----------
+    size : int
+        Pool size, only used when the pool is first created
+
+    Returns
+    -------
+    The DriverPool object
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(size)
+            atexit.register(_pool.close)
+    return _pool
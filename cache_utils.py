@@ -0,0 +1,216 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+DAY = 24 * 60 * 60
+
+# Time-to-live (seconds) for each kind of page, matched on a substring of the URL. None means the response never
+# expires: a finished game's play-by-play or boxscore is never going to change.
+ENDPOINT_TTLS = [
+    ('playbyplayv2', None),
+    ('boxscoretraditionalv2', None),
+    ('leaguedashplayerstats', DAY),
+    ('basketball-reference.com/leagues', DAY),
+    # Only finished ESPN games are ever requested
+    ('site.api.espn.com/apis/site/v2/sports/basketball/nba/summary', None),
+]
+DEFAULT_TTL = DAY
+
+
+class OfflineCacheMiss(ValueError):
+    """
+    Raised in offline mode when a URL has never been cached
+    """
+
+
+def ttl_for_url(url):
+    """
+    Get the time-to-live of a cached response
+    Parameters
+    ----------
+    url : String
+        The URL that was requested
+
+    Returns
+    -------
+    The number of seconds the response stays fresh, or None if it never expires
+    """
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern in url:
+            return ttl
+    return DEFAULT_TTL
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent, compressed response cache keyed by URL. Bodies are stored as zlib-compressed files and tracked in a
+    small SQLite index holding their size, when they were stored and when they were last read, so the cache can be
+    capped in size by evicting the least recently used entries. The index also keeps the ETag/Last-Modified
+    validators and a hash of each body, so stale entries can be revalidated instead of downloaded again.
+    Parameters
+    ----------
+    directory : String or Path
+        Where the cache lives
+    max_bytes : int
+        Size cap (compressed) of the whole cache
+    offline : bool
+        If True, only serve from the cache and never allow a network request
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, offline=False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, key TEXT, size INTEGER, "
+                        "stored_at REAL, last_access REAL)")
+        # Caches created before validators were stored are missing these columns
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(responses)")}
+        for column in ('etag', 'last_modified', 'content_hash'):
+            if column not in existing:
+                self.db.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+        self.db.commit()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.z"
+
+    def lookup(self, url):
+        """
+        Get everything we know about a cached URL, whether or not it is still fresh
+        Parameters
+        ----------
+        url : String
+
+        Returns
+        -------
+        A dictionary with the body (content), whether it is still fresh, its etag, last_modified and content_hash,
+        or None if the URL is not cached. In offline mode a missing entry raises OfflineCacheMiss.
+        """
+        with self.lock:
+            entry = self.db.execute("SELECT key, stored_at, etag, last_modified, content_hash FROM responses "
+                                    "WHERE url = ?", (url,)).fetchone()
+            result = None
+            if entry is not None:
+                key, stored_at, etag, last_modified, stored_hash = entry
+                try:
+                    content = zlib.decompress(self._path(key).read_bytes())
+                except (OSError, zlib.error):
+                    # The file is gone or corrupted. Forget about it.
+                    self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                else:
+                    self.db.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+                    ttl = ttl_for_url(url)
+                    result = {
+                        'content': content,
+                        'fresh': ttl is None or time.time() - stored_at < ttl,
+                        'etag': etag,
+                        'last_modified': last_modified,
+                        'content_hash': stored_hash,
+                    }
+                self.db.commit()
+
+        if result is None and self.offline:
+            raise OfflineCacheMiss(f"Not cached (offline mode): {url}")
+        return result
+
+    def get(self, url):
+        """
+        Get the cached body for a URL
+        Parameters
+        ----------
+        url : String
+
+        Returns
+        -------
+        The response body as bytes, or None if it is not cached or has expired. In offline mode expired entries are
+        still returned and a missing entry raises OfflineCacheMiss.
+        """
+        entry = self.lookup(url)
+        if entry is None or not (entry['fresh'] or self.offline):
+            return None
+        return entry['content']
+
+    def touch(self, url):
+        """
+        Mark a cached entry as fresh again, e.g. after the server answered a conditional request with 304
+        Parameters
+        ----------
+        url : String
+        """
+        with self.lock:
+            self.db.execute("UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+
+    def put(self, url, content, etag=None, last_modified=None):
+        """
+        Store the body of a response. Only call this once the response has been parsed successfully, so that error
+        pages never make it into the cache.
+        Parameters
+        ----------
+        url : String
+        content : bytes
+        etag : String
+            The ETag header of the response, if any
+        last_modified : String
+            The Last-Modified header of the response, if any
+        """
+        key = hashlib.sha1(url.encode()).hexdigest()
+        path = self._path(key)
+        compressed = zlib.compress(content, 6)
+        with self.lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(compressed)
+            now = time.time()
+            self.db.execute("INSERT OR REPLACE INTO responses (url, key, size, stored_at, last_access, etag, "
+                            "last_modified, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (url, key, len(compressed), now, now, etag, last_modified, content_hash(content)))
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used entries until we are back under the cap
+        for url, key, size in self.db.execute("SELECT url, key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._path(key).unlink(missing_ok=True)
+            self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Get the shared response cache, creating it under DataPack the first time it is used
+    Returns
+    -------
+    The ResponseCache object
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(Path.cwd() / "DataPack" / "HTTPCache")
+    return _cache
+
+
+def set_offline(offline=True):
+    """
+    Turn offline mode on or off. In offline mode every fetch is served from the cache, which lets you re-run the
+    parsing stages (e.g. after a parser fix) without touching the network.
+    Parameters
+    ----------
+    offline : bool
+    """
+    get_cache().offline = offline
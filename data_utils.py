@@ -4,36 +4,24 @@ from pathlib import Path
 import json
 from wakepy import keep
 import os
-import ast
-import math
+import re
 import pbp_utils
+import fetch_utils
+import browser_utils
+import bbref_utils
+import cache_utils
+import espn_utils
+import event_store_utils
+import job_utils
+import schema_utils
+import storage_utils
 import numpy as np
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
-import pyautogui
-import time
 from datetime import datetime, date
-import urllib3
 from unidecode import unidecode
-import bs4
-
-# Headers for API request
-header_data = {
-    'Connection': 'keep-alive',
-    'Accept': 'application/json, text/plain, */*',
-    'x-nba-stats-token': 'true',
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) '
-                  'Chrome/79.0.3945.130 Safari/537.36',
-    'x-nba-stats-origin': 'stats',
-    'Sec-Fetch-Site': 'same-origin',
-    'Sec-Fetch-Mode': 'cors',
-    'Referer': 'https://stats.nba.com/',
-    'Accept-Encoding': 'gzip, deflate, br',
-    'Accept-Language': 'en-US,en;q=0.9',
-}
 
 
 def normalize_keys(obj):
@@ -50,7 +38,7 @@ def normalize_keys(obj):
         return obj
 
 
-def save_file(data, directory, filename):
+def save_file(data, directory, filename, fmt=None):
     cwd = Path.cwd()
 
     directory = Path(directory)
@@ -65,9 +53,8 @@ def save_file(data, directory, filename):
     full_path = data_pack_dir / filename
 
     if isinstance(data, pd.DataFrame):
-        if not str(full_path).lower().endswith('.csv'):
-            full_path = Path(full_path).stem + '.csv'
-        data.to_csv(full_path, index=False)
+        # Season datasets go to the format chosen for them in storage_utils, everything else is a CSV
+        storage_utils.save(data, data_pack_dir, filename, fmt)
     elif isinstance(data, (dict, list)):
         data = normalize_keys(data)
         if not str(full_path).lower().endswith('.json'):
@@ -135,82 +122,108 @@ def player_stats_url(year):
            f"&VsConference=&VsDivision=&Weight="
 
 
-def extract_data(url, error_counter=0):
+def extract_data(url):
     """
-    Extract the data stored at a specific URL
+    Extract the data stored at a specific URL. Timeouts, 429s and server errors are retried with backoff by the
+    shared client in fetch_utils.
     Parameters
     ----------
     url : String
         The connection URL
-    error_counter : int
-        Counts number of errors
 
     Returns
     -------
     The data from the URL in the form of a pandas dataframe.
     """
-    # I keep this print statement in just so I can see my progress
-    print(url)
-    # Call to the url
+    # I keep this print statement in just so I can see my progress (and how fast the server is letting us go)
+    rate = fetch_utils.current_rate(url)
+    print(url if rate is None else f"{url} [{rate:.2f} req/s]")
+    # Call to the url, unless we already have the response on disk, and decode the JSON straight into a typed dataframe
     try:
-        r = requests.get(url, headers=header_data, timeout=10)
-        # Convert the data to JSON format
-        resp = r.json()
-        # Create our dataframe from this JSON
-        results = resp['resultSets'][0]
-        headers = results['headers']
-        rows = results['rowSet']
-        frame = pd.DataFrame(rows)
-        frame.columns = headers
-
-    except requests.exceptions.Timeout:
-        error_counter += 1
-        if error_counter < 5:
-            extract_data(url, error_counter)
-        else:
-            print("Request timed out. Skipping...")
+        frame = fetch_utils.get_cached(
+            url, lambda content: schema_utils.decode_result_set(content, schema_utils.endpoint_from_url(url)))
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        print("Request timed out. Skipping...")
         return None
     return frame
 
 
-def extract_data_urllib(http_client, url):
+def get_page(url):
     """
-    Extract data from the API endpoint
+    Get the raw body of a page, going through the response cache. A stale cached copy is revalidated with a
+    conditional request (ETag / Last-Modified), and a full download is compared to the cached copy by hash, so we can
+    tell whether the page actually changed. A new body is not cached here: the caller caches it by calling commit once
+    it has parsed the page and written its output. Otherwise a run that fails in between would find the page unchanged
+    next time and keep its stale output.
     Parameters
     ----------
-    http_client : urllib3.PoolManager object
     url : String
         The URL you are interested in
 
     Returns
     -------
-    The dataframe containing the stats of all players for the season you specified.
+    The body of the page as bytes, whether it changed since it was last cached, and commit, which caches the body
     """
-    # Call to the GET endpoint
-    r = http_client.request('GET', url, headers=header_data)
-    # Get the JSON
-    resp = json.loads(r.data)
-    # Convert the json into a pandas dataframe
-    results = resp['resultSets'][0]
-    headers = results['headers']
-    rows = results['rowSet']
-    data_frame = pd.DataFrame(rows)
-    data_frame.columns = headers
-    return data_frame
+    cache = cache_utils.get_cache()
+    entry = cache.lookup(url)
+    if entry is not None and (entry['fresh'] or cache.offline):
+        return entry['content'], False, lambda: None
+
+    headers = dict(fetch_utils.headers_for(url) or {})
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    r = fetch_utils.get(url, headers=headers)
+    if r.status_code == 304 and entry is not None:
+        cache.touch(url)
+        return entry['content'], False, lambda: None
+    # Don't cache (or parse) error pages
+    r.raise_for_status()
+
+    content = r.content
+    changed = entry is None or cache_utils.content_hash(content) != entry['content_hash']
+    etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+
+    def commit():
+        cache.put(url, content, etag=etag, last_modified=last_modified)
+    return content, changed, commit
 
 
 def get_nba_stats_data(year):
-    client = urllib3.PoolManager()
-    season = str(year) + '-' + str(year)[2:]
+    """
+    Get the stats.nba.com player totals for a season
+    Parameters
+    ----------
+    year : int
+        The season you are interested in
 
-    frame = extract_data_urllib(client, player_stats_url(season))
-    frame = frame.dropna(subset=['PLAYER_ID'])
+    Returns
+    -------
+    True if the data changed and was rewritten, False if nothing changed since the last run
+    """
+    season = str(year) + '-' + str(year)[2:]
     dirname = "DataPack"
     mini_dir = "NBAStats"
     dirname = Path.cwd() / dirname / mini_dir
     filename = f"nba_stats_{year}.csv"
 
+    url = player_stats_url(season)
+    print(url)
+    content, changed, commit = get_page(url)
+    if not changed and os.path.isfile(dirname / filename):
+        commit()
+        return False
+
+    frame = schema_utils.decode_result_set(content, schema_utils.endpoint_from_url(url))
+    frame = frame.dropna(subset=['PLAYER_ID'])
+
     save_file(frame, dirname, filename)
+    # Only now is the page worth caching, the output written from it is safely saved
+    commit()
+    return True
 
 
 def player_totals_page(year):
@@ -243,118 +256,52 @@ def player_advanced_page(year):
     return f"https://www.basketball-reference.com/leagues/NBA_{year}_advanced.html"
 
 
-def extract_column_names(table):
-    """
-    Get the column names from the BB Ref HTML table
-    Parameters
-    ----------
-    table : table header (<th> tag)
-
-    Returns
-    -------
-    The column names
-    """
-    cols = [col["aria-label"] for col in table.find_all("thead")[0].find_all("th")][1:]
-    cols.append("id")
-    return cols
-
-
-def extract_rows(table):
-    """
-    Get the rows from the HTML table (get the <tr>'s)
-    Parameters
-    ----------
-    table : HTML table (<table>)
-
-    Returns
-    -------
-    All rows from the table, properly parsed
-    """
-
-    # Get all rows in the table
-    trs = table.find_all("tbody")[0].find_all("tr")
-    # Parse each row and return
-    parsed_rows = [parse_row(row) for row in trs if parse_row(row) is not None and len(parse_row(row)) > 0]
-    return parsed_rows
-
-
-def parse_row(row):
+def get_bbref_data(year):
     """
-    Parse a given row
+    Get the basketball-reference totals and advanced stats for a season
     Parameters
     ----------
-    row : row of an HTML table (<tr>)
+    year : int
+        The season you are interested in
 
     Returns
     -------
-    The data from the row
+    True if the data changed and was rewritten, False if nothing changed since the last run
     """
-    # Get all table data elements
-    other_data = row.find_all("td")
-
-    # If there is no data, return an empty list
-    if len(other_data) == 0:
-        return []
-
-    page_links = other_data[0].find_all("a")
-
-    if page_links is None or len(page_links) == 0:
-        return None
-
-    # Get the player ids from the URLs associated with them
-    ids = page_links[0]["href"].split("/")[-1].replace(".html", "")
-    row_data = [td.string for td in other_data]
-    row_data.append(ids)
-    return row_data
-
-
-def get_bbref_data(year):
-    http = urllib3.PoolManager()
-    columns = []
-    rows = []
-
     season = year + 1
 
-    # Request the page with a GET request
-    r = http.request('GET', player_totals_page(season))
-    # Use BS4 to parse the page
-    soup = bs4.BeautifulSoup(r.data, 'html.parser')
-    # Get all <table> elements
-    f = soup.find_all("table")
-
-    # Get the columns and rows
-    if len(f) > 0:
-        columns = extract_column_names(f[0])
-        rows = extract_rows(f[0])
-
-    # Convert your data to a pandas dataframe and return it
-    frame = pd.DataFrame(rows)
-    frame.columns = columns
-
-    # Request the page with a GET request
-    r = http.request('GET', player_advanced_page(season))
-    # Use BS4 to parse the page
-    soup = bs4.BeautifulSoup(r.data, 'html.parser')
-    # Get all <table> elements
-    f = soup.find_all("table")
-
-    # Get the columns and rows
-    if len(f) > 0:
-        columns = extract_column_names(f[0])
-        rows = extract_rows(f[0])
-
-    # Convert your data to a pandas dataframe and return it
-    frame2 = pd.DataFrame(rows)
-    frame2.columns = columns
-
-    frame = frame.merge(frame2, on=['Player', 'Pos', 'Age', 'Team', 'id', 'G', 'MP'])
-
     dirname = "DataPack"
     mini_dir = "BBRef"
     dirname = Path.cwd() / dirname / mini_dir
     filename = f"bbref_totals_{year}.csv"
 
+    # Request both pages at once. If neither changed there is nothing to re-parse.
+    urls = [player_totals_page(season), player_advanced_page(season)]
+    pages = {}
+    for url, page, error in fetch_utils.fetch_concurrently(urls, get_page, workers=2):
+        if error is not None:
+            raise error
+        pages[url] = page
+    (totals_page, totals_changed, totals_commit), (advanced_page, advanced_changed, advanced_commit) = \
+        pages[urls[0]], pages[urls[1]]
+    if not totals_changed and not advanced_changed and os.path.isfile(dirname / filename):
+        totals_commit()
+        advanced_commit()
+        return False
+
+    frame = bbref_utils.parse_table(totals_page)
+    frame2 = bbref_utils.parse_table(advanced_page)
+
+    # A player has one row per team he played for (plus the combined row), so a row is identified by id and team
+    key = ['id', 'Team']
+    advanced_columns = [column for column in frame2.columns if column not in frame.columns]
+    frame = frame.merge(frame2[key + advanced_columns], on=key)
+
     save_file(frame, dirname, filename)
+    # Only now are the pages worth caching, the output written from them is safely saved
+    totals_commit()
+    advanced_commit()
+    return True
 
 
 def deduplicate_traded_players(group):
@@ -408,71 +355,171 @@ def id_matching(year):
     save_file(name_matches_ids, dirname, filename)
 
 
-def get_nba_schedule(year):
-    dirname = "DataPack"
-    filename = f"nba_schedule_{year}.json"
-    filename_full = Path.cwd() / dirname / filename
-    if os.path.isfile(filename_full):
-        return
+def scrape_team_schedule(driver, tid, year):
+    """
+    Get the regular season games on a team's nba.com schedule page
+    Parameters
+    ----------
+    driver : webdriver.Chrome
+    tid : String
+        The team's nba.com id
+    year : int
+        The year the season starts in
 
-    team_id_map = get_nba_team_id_map()
-    team_ids = list(team_id_map.values())
-    schedule = {}
+    Returns
+    -------
+    A list of (date, game id) tuples
+    """
+    driver.get(f"https://www.nba.com/team/{tid}/schedule")
 
-    driver = webdriver.Chrome()
+    # Wait for table whose class starts with Crom_Body
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.XPATH, "//tbody[starts-with(@class, 'Crom_body')]"))
+    )
+
+    # Locate all table rows within that table
+    rows = driver.find_elements(By.XPATH, "//tbody[starts-with(@class, 'Crom_body')]//tr")
+
+    games = []
+    for row in rows:
+        game_id = row.get_attribute("data-game-id")
+        if not game_id:
+            continue  # skip header or malformed rows
+
+        # Get the first <td> (contains text like "Oct 7")
+        tds = row.find_elements(By.TAG_NAME, "td")
+        if not tds:
+            continue
+
+        date_text = tds[0].text.strip()
+        month_str = date_text.split()[0]
+
+        if month_str.lower() in ("oct", "nov", "dec"):
+            actual_year = year
+        else:
+            actual_year = year + 1
 
-    for tid in team_ids:
         try:
-            driver.get(f"https://www.nba.com/team/{tid}/schedule")  # Example team; replace dynamically if needed
+            # Parse "Oct 7" into a date object using the given year
+            date_obj = datetime.strptime(f"{date_text} {actual_year}", "%b %d %Y").date()
+        except ValueError:
+            # If parsing fails (e.g., blank cell), skip
+            continue
 
-            # Wait for table whose class starts with Crom_Body
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//tbody[starts-with(@class, 'Crom_body')]"))
-            )
+        if game_id.startswith('002'):
+            games.append((date_obj, game_id))
+    return games
 
-            # Locate all table rows within that table
-            rows = driver.find_elements(By.XPATH, "//tbody[starts-with(@class, 'Crom_body')]//tr")
 
-            for row in rows:
-                game_id = row.get_attribute("data-game-id")
-                if not game_id:
-                    continue  # skip header or malformed rows
+def league_schedule_url(year):
+    season = str(year) + '-' + str(year + 1)[2:]
+    return f"https://stats.nba.com/stats/scheduleleaguev2?LeagueID=00&Season={season}"
 
-                # Get the first <td> (contains text like "Oct 7")
-                tds = row.find_elements(By.TAG_NAME, "td")
-                if not tds:
-                    continue
 
-                date_text = tds[0].text.strip()
-                month_str = date_text.split()[0]
+def get_league_schedule(year):
+    """
+    Get the regular season schedule for the whole league in a single request
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
 
-                if month_str.lower() in ("oct", "nov", "dec"):
-                    actual_year = year
-                else:
-                    actual_year = year + 1
+    Returns
+    -------
+    A dictionary of date -> list of game ids
+    """
+    content, changed, commit = get_page(league_schedule_url(year))
+    game_dates = schema_utils.load_json(content)['leagueSchedule']['gameDates']
 
-                try:
-                    # Parse "Oct 7" into a date object using the given year
-                    date_obj = datetime.strptime(f"{date_text} {actual_year}", "%b %d %Y").date()
-                except ValueError:
-                    # If parsing fails (e.g., blank cell), skip
-                    continue
+    schedule = {}
+    for game_date in game_dates:
+        for game in game_date['games']:
+            game_id = game['gameId']
+            if not game_id.startswith('002'):
+                continue
+            date_obj = datetime.strptime(game['gameDateEst'][:10], "%Y-%m-%d").date()
+            schedule.setdefault(date_obj, []).append(game_id)
+    # Only cache a schedule that parsed
+    commit()
+    return schedule
+
+
+def crawl_team_schedules(year):
+    """
+    Build the schedule from the 30 nba.com team schedule pages. Slower than get_league_schedule, kept as a fallback.
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+
+    Returns
+    -------
+    A dictionary of date -> list of game ids
+    """
+    team_id_map = get_nba_team_id_map()
+    team_ids = list(team_id_map.values())
+    schedule = {}
+
+    # Team pages are loaded in parallel across the headless driver pool, paced by the adaptive controller for nba.com
+    pool = browser_utils.get_driver_pool()
+    controller = fetch_utils.get_rate_controller("www.nba.com")
+
+    pages = pool.map(lambda driver, tid: scrape_team_schedule(driver, tid, year), team_ids, controller=controller)
+    for tid, games, error in pages:
+        if error is not None:
+            print(f"Error!: {error} (slowing down to {controller.rate:.2f} pages/s)")
+            continue
+        for date_obj, game_id in games:
+            if date_obj not in schedule:
+                schedule[date_obj] = []
+            if game_id not in schedule[date_obj]:
+                schedule[date_obj].append(game_id)
+    return schedule
+
+
+def get_nba_schedule(year):
+    """
+    Build or refresh the season's date -> game ids schedule. Games already played are kept from the saved schedule,
+    and only today and the future are refreshed, so postponed or added games get picked up. Once the whole season is
+    in the past the saved schedule is left alone.
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
 
-                if date_obj not in schedule:
-                    schedule[date_obj] = []
+    Returns
+    -------
+    A dictionary of date -> list of game ids
+    """
+    dirname = "DataPack"
+    filename = f"nba_schedule_{year}.json"
+    filename_full = Path.cwd() / dirname / filename
+    today = date.today()
 
-                if game_id not in schedule[date_obj] and game_id.startswith('002'):
-                    schedule[date_obj].append(game_id)
+    schedule = {}
+    if os.path.isfile(filename_full):
+        with open(filename_full, "r") as f:
+            schedule = {datetime.strptime(k, "%Y-%m-%d").date(): v for k, v in json.load(f).items()}
+        # Nothing left to refresh, or no network to refresh it with
+        if schedule and (max(schedule) < today or cache_utils.get_cache().offline):
+            return schedule
 
-                # Delete useless ones
-                if len(schedule[date_obj]) == 0:
-                    del schedule[date_obj]
-        except Exception as e:
-            print(f"Error!: {e}")
-        time.sleep(2)
+    try:
+        fresh = get_league_schedule(year)
+    except cache_utils.OfflineCacheMiss:
+        # Offline, the team pages can't be crawled either. Say which page is missing instead of hiding it.
+        raise
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"League schedule unavailable ({e!r}), crawling the team pages instead")
+        fresh = crawl_team_schedules(year)
+
+    # Past dates are final, only take today and later from the fresh schedule
+    schedule = {k: v for k, v in schedule.items() if k < today}
+    schedule.update({k: v for k, v in fresh.items() if k >= today or k not in schedule})
+    schedule = dict(sorted(schedule.items(), key=lambda x: x[0]))
 
     save_file(schedule, dirname, filename)
-    driver.quit()
+    return schedule
 
 
 def get_nba_game_ids(year):
@@ -509,7 +556,44 @@ def get_nba_game_ids(year):
     return beginning_string, all_game_ids
 
 
-def scrape_nba_pbp(year):
+def saved_game_ids(directory, filename):
+    """
+    Get the game ids found in one of our output files, padded back to the 10 character stats.nba.com format
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+
+    Returns
+    -------
+    A list of game id strings
+    """
+    return [str(gid).zfill(10) for gid in storage_utils.stored_game_ids(directory, filename)]
+
+
+def report_dead_letters(queue, stage):
+    for game_id, attempts, last_error in queue.dead_letters(stage):
+        print(f"Gave up on {stage} for game {game_id} after {attempts} attempts: {last_error}")
+
+
+def scrape_nba_pbp(year, workers=4):
+    """
+    Scrape the play-by-play for every game played so far in the season, skipping games already saved.
+    What is left is tracked per game in the season's job table, and a game that keeps failing is dead-lettered
+    instead of stopping the scrape. Games are fetched concurrently by a bounded pool of workers. All of them share
+    the adaptive rate controller for stats.nba.com, so the scrape goes as fast as the server allows instead of
+    sleeping before every game.
+    Parameters
+    ----------
+    year : int
+        The season you are interested in
+    workers : int
+        Maximum number of requests in flight at once
+
+    Returns
+    -------
+    The season's play-by-play as a memory-mapped event_store_utils.EventStore, or None if no game was ever saved
+    """
     columns = ['GAME_ID', 'EVENTNUM', 'EVENTMSGTYPE', 'EVENTMSGACTIONTYPE', 'PERIOD', 'WCTIMESTRING', 'PCTIMESTRING',
                'HOMEDESCRIPTION', 'NEUTRALDESCRIPTION', 'VISITORDESCRIPTION', 'SCORE', 'SCOREMARGIN', 'PERSON1TYPE',
                'PLAYER1_ID', 'PLAYER1_NAME', 'PLAYER1_TEAM_ID', 'PLAYER1_TEAM_CITY', 'PLAYER1_TEAM_NICKNAME',
@@ -518,87 +602,66 @@ def scrape_nba_pbp(year):
                'PLAYER3_NAME', 'PLAYER3_TEAM_ID', 'PLAYER3_TEAM_CITY', 'PLAYER3_TEAM_NICKNAME',
                'PLAYER3_TEAM_ABBREVIATION', 'VIDEO_AVAILABLE_FLAG']
 
-    error_counter = 0
+    stage = 'pbp'
+    queue = job_utils.get_job_queue(year)
 
     with keep.presenting():
         # game_id starting string. This changes from year-to-year.
         beginning_string, ids = get_nba_game_ids(year)
 
-        game_id = ids[0]
-
         dirname = Path.cwd() / "DataPack"
         file_short = f"reg_pbp_{year}.csv"
 
-        existing_file = dirname / file_short
-
-        existing_data = None
-
-        new_data_frames = []
-
-        if os.path.isfile(existing_file):
-            existing_data = pd.read_csv(existing_file)
-            existing_game_ids = existing_data["GAME_ID"].drop_duplicates().tolist()
-            existing_game_ids = ["00" + str(item) if type(item) is not str else str(item) for item in existing_game_ids]
-            ids = [gid for gid in ids if gid not in existing_game_ids]
-
-        if existing_data is None:
-            existing_data = extract_data(play_by_play_url(game_id))
-            ids = ids[1:]
-
-        for x in range(len(ids)):
-            if error_counter >= 5:
-                if new_data_frames:
-                    combined_new = pd.concat(new_data_frames, ignore_index=True)
-                    if existing_data is not None:
-                        all_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                             ignore_index=True).drop_duplicates()
-                    else:
-                        all_data = combined_new[columns]
-                    all_data.drop_duplicates(inplace=True)
-                    save_file(all_data, dirname, file_short)
-                raise IndexError("Too many consecutive errors! Wrong game/s indexed?\n"
-                                 "Writing current data and stopping...")
-            # Required to have the website not block you. 2 seconds is the shortest sleep period that has worked for me.
-            time.sleep(3)
-
-            # Update the game id depending on x
-            # This has been changed to read straight from the schedule so may not need these
-            # 0 adding shenanigans
-            # game_id = beginning_string + "".join(["0" for y in range(5 - len(str(x)))]) + str(x)
-            game_id = ids[x]
-            try:
-                # Extract the pbp data
-                holder_play_by_play = extract_data(play_by_play_url(game_id))
-                if holder_play_by_play is None:
-                    x -= 1
-                    error_counter += 1
-                    continue
-                new_data_frames.append(holder_play_by_play[columns])
-                error_counter = 0
+        existing_file = storage_utils.saved_path(dirname, file_short)
+
+        # The job table knows which games are left, so the saved games never have to be read
+        ids = job_utils.sync_stage(queue, stage, ids, existing_file, lambda: saved_game_ids(dirname, file_short))
+
+        # Frames are keyed by game id as they stream in so the output keeps schedule order
+        new_data_frames = {}
 
+        queue.start(stage, ids)
+        games = fetch_utils.fetch_concurrently(ids, lambda gid: extract_data(play_by_play_url(gid)), workers=workers)
+
+        # A game that fails is recorded and retried on the next run, the rest of the season carries on
+        for game_id, holder_play_by_play, error in games:
+            if error is None and holder_play_by_play is None:
+                queue.fail(stage, game_id, "Request failed")
+            elif error is None:
+                try:
+                    new_data_frames[game_id] = holder_play_by_play[columns]
+                except KeyError as e:
+                    print(f"Column/s missing for game: {game_id}")
+                    queue.fail(stage, game_id, e)
+            # Offline mode without the game cached. The game is fine, so it stays pending for a run that can fetch it
+            elif isinstance(error, cache_utils.OfflineCacheMiss):
+                print(f"{game_id}: {error}")
+                queue.release(stage, [game_id])
             # Catch the case in which the URL doesn't exist (sometimes the game id skips a number)
-            except requests.exceptions.JSONDecodeError:
+            elif isinstance(error, (requests.exceptions.JSONDecodeError, json.JSONDecodeError)):
                 print(f"Game does not exist for game: {game_id}")
-                error_counter += 1
-            except ValueError as v:
-                print(f"{game_id}: {v}")
-                error_counter += 1
-            except KeyError:
-                print(f"Column/s missing for game: {game_id}")
-                error_counter += 1
-
-        # Remove duplicated rows and write to a csv file
-        if new_data_frames:
-            combined_new = pd.concat(new_data_frames, ignore_index=True)
-            if existing_data is not None:
-                existing_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                          ignore_index=True).drop_duplicates()
+                queue.fail(stage, game_id, error)
             else:
-                existing_data = combined_new[columns]
+                print(f"{game_id}: {error!r}")
+                queue.fail(stage, game_id, error)
 
-        existing_data.drop_duplicates(inplace=True)
-        save_file(existing_data, dirname, file_short)
-        return existing_data
+        report_dead_letters(queue, stage)
+
+        frames = [new_data_frames[gid] for gid in ids if gid in new_data_frames]
+        if not frames:
+            print("No new games!")
+        else:
+            combined_new = pd.concat(frames, ignore_index=True)[columns].drop_duplicates()
+
+            # Only the new games are written, each to its own segment of the season. A game scraped again replaces
+            # its old rows.
+            storage_utils.append_games(combined_new, dirname, file_short)
+            queue.done(stage, list(new_data_frames))
+
+        if not storage_utils.exists(dirname, file_short):
+            return None
+        # Every later stage looks the season up one game at a time
+        return event_store_utils.open_store(dirname, file_short)
 
 
 def advanced_boxscore_url(game_id, start, end):
@@ -632,9 +695,76 @@ def frame_to_row(df):
     return lst
 
 
-def players_at_period(pbp, game_id):
-    play_by_play = pbp.loc[pbp['GAME_ID'] == int(game_id)]
-    play_by_play.loc[:, 'EVENTNUM'] = play_by_play.index.values
+def is_valid_player(player_id, team_id):
+    # Team events (team rebounds, team turnovers, etc.) have no player team id, and empty player slots are 0
+    return not (pd.isna(player_id) or pd.isna(team_id) or player_id == 0)
+
+
+def infer_period_starters(play_by_play):
+    """
+    Work out the five players on the court for each team at the start of each period from the play-by-play alone.
+    A player started the period if they show up in any event (including being subbed out) before they are subbed in.
+    Players who play the whole period without showing up in an event can't be found this way, so those periods
+    are left for the caller to resolve.
+    Parameters
+    ----------
+    play_by_play : pandas.DataFrame
+        The play-by-play for a single game, in event order
+
+    Returns
+    -------
+    A dictionary of period -> {team_id: sorted list of player ids}. Only teams where exactly five starters were
+    found are included.
+    """
+    columns = [pbp_utils.event_type, pbp_utils.period_column, pbp_utils.player1_id, pbp_utils.player1_team_id,
+               pbp_utils.player2_id, pbp_utils.player2_team_id, pbp_utils.player3_id, pbp_utils.player3_team_id]
+    events = play_by_play[columns + [pbp_utils.event_subtype]]
+
+    # Timeouts, ejections and technicals can involve players on the bench, so they say nothing about who is on court
+    ignored = events[pbp_utils.event_type].isin([9, 11]) | pbp_utils.is_technical_foul(events)
+    events = events.loc[~ignored, columns]
+
+    starters = {}
+    subbed_in = {}
+    for msg_type, period, p1, t1, p2, t2, p3, t3 in events.itertuples(index=False, name=None):
+        period = int(period)
+        period_starters = starters.setdefault(period, {})
+        period_subbed_in = subbed_in.setdefault(period, set())
+
+        if msg_type == 8:
+            # PLAYER1 is the player going out and PLAYER2 is the player coming in. Anyone subbed out before they
+            # were ever subbed in must have started the period.
+            if is_valid_player(p1, t1) and int(p1) not in period_subbed_in:
+                period_starters.setdefault(int(t1), set()).add(int(p1))
+            if is_valid_player(p2, t2):
+                period_subbed_in.add(int(p2))
+            continue
+
+        for player_id, team_id in ((p1, t1), (p2, t2), (p3, t3)):
+            if is_valid_player(player_id, team_id) and int(player_id) not in period_subbed_in:
+                period_starters.setdefault(int(team_id), set()).add(int(player_id))
+
+    return {
+        period: {team_id: sorted(players) for team_id, players in teams.items() if len(players) == 5}
+        for period, teams in starters.items()
+    }
+
+
+def players_subbed_in_first(play_by_play):
+    """
+    Find the players whose first substitution of each period was coming into the game, i.e. the players that did
+    not start the period
+    Parameters
+    ----------
+    play_by_play : pandas.DataFrame
+        The play-by-play for a single game
+
+    Returns
+    -------
+    A dataframe of PLAYER_ID, PERIOD, SUB
+    """
+    # Number the events in game order. EVENTNUM is a typed column, so this is a new column rather than an in-place write.
+    play_by_play = play_by_play.assign(EVENTNUM=np.arange(len(play_by_play), dtype='int32'))
 
     substitutions_only = play_by_play[play_by_play['EVENTMSGTYPE'] == 8][
         ['PERIOD', 'EVENTNUM', 'PLAYER1_ID', 'PLAYER2_ID']]
@@ -645,35 +775,80 @@ def players_at_period(pbp, game_id):
 
     full_subs = pd.concat([subs_out, subs_in], axis=0).reset_index()[['PLAYER_ID', 'PERIOD', 'EVENTNUM', 'SUB']]
     first_event_of_period = full_subs.loc[full_subs.groupby(by=['PERIOD', 'PLAYER_ID'])['EVENTNUM'].idxmin()]
-    players_subbed_in_at_each_period = first_event_of_period[first_event_of_period['SUB'] == 'IN'][
-        ['PLAYER_ID', 'PERIOD', 'SUB']]
+    return first_event_of_period[first_event_of_period['SUB'] == 'IN'][['PLAYER_ID', 'PERIOD', 'SUB']]
+
+
+def boxscore_period_starters(game_id, period, players_subbed_in_at_each_period):
+    """
+    Get the players on the court at the start of a period from the boxscore of that period. Everyone who played in
+    the period and was not subbed in must have started it. This costs an HTTP request, so it is only used when the
+    play-by-play is ambiguous.
+    Parameters
+    ----------
+    game_id : String
+    period : int
+    players_subbed_in_at_each_period : pandas.DataFrame
+        Output of players_subbed_in_first
 
-    periods = players_subbed_in_at_each_period['PERIOD'].drop_duplicates().values.tolist()
+    Returns
+    -------
+    The row [TEAM_ID_1, TEAM_1_PLAYERS, TEAM_ID_2, TEAM_2_PLAYERS, PERIOD], or None if the boxscore could not be
+    fetched
+    """
+    low = calculate_time_at_period(period) + 5
+    high = calculate_time_at_period(period + 1) - 5
+    boxscore_players = extract_data(advanced_boxscore_url(game_id, low, high))
+    if boxscore_players is None:
+        return None
+    boxscore_players = boxscore_players[['PLAYER_NAME', 'PLAYER_ID', 'TEAM_ID']]
+    boxscore_players['PERIOD'] = period
+
+    players_subbed_in_at_period = players_subbed_in_at_each_period[
+        players_subbed_in_at_each_period['PERIOD'] == period]
+
+    joined_players = pd.merge(boxscore_players, players_subbed_in_at_period, on=['PLAYER_ID', 'PERIOD'], how='left')
+    joined_players = joined_players[pd.isnull(joined_players['SUB'])][
+        ['PLAYER_NAME', 'PLAYER_ID', 'TEAM_ID', 'PERIOD']]
+    row = frame_to_row(joined_players)
+    row.append(period)
+    return row
+
+
+def players_at_period(pbp, game_id):
+    """
+    Get the players on the court for both teams at the start of every period of a game. The starters are inferred
+    from the play-by-play, and the boxscore is only requested for periods where that is ambiguous.
+    Parameters
+    ----------
+    pbp : event_store_utils.EventStore
+        The play-by-play for the season. A dataframe also works, but is scanned for the game
+    game_id : String
+
+    Returns
+    -------
+    A dataframe with one row per period, or None if a fallback boxscore could not be fetched
+    """
+    play_by_play = event_store_utils.game_events(pbp, game_id)
+    inferred = infer_period_starters(play_by_play)
+
+    periods = sorted(int(period) for period in play_by_play['PERIOD'].dropna().unique())
+    players_subbed_in_at_each_period = None
 
     rows = []
     for period in periods:
-        low = calculate_time_at_period(period) + 5
-        high = calculate_time_at_period(period + 1) - 5
-        boxscore = advanced_boxscore_url(game_id, low, high)
-        if boxscore is None:
+        teams = inferred.get(period, {})
+        if len(teams) == 2:
+            (team1, players1), (team2, players2) = teams.items()
+            rows.append([team1, players1, team2, players2, period])
+            continue
+
+        # Somebody played the whole period without showing up in the play-by-play. Ask the boxscore.
+        if players_subbed_in_at_each_period is None:
+            players_subbed_in_at_each_period = players_subbed_in_first(play_by_play.copy())
+        row = boxscore_period_starters(game_id, period, players_subbed_in_at_each_period)
+        if row is None:
             print(f"Error getting game {game_id}")
             return None
-        boxscore_players = extract_data(boxscore)
-        if boxscore_players is None:
-            print(f"Error getting game {game_id}")
-            return None
-        else:
-            boxscore_players = boxscore_players[['PLAYER_NAME', 'PLAYER_ID', 'TEAM_ID']]
-        boxscore_players['PERIOD'] = period
-
-        players_subbed_in_at_period = players_subbed_in_at_each_period[
-            players_subbed_in_at_each_period['PERIOD'] == period]
-
-        joined_players = pd.merge(boxscore_players, players_subbed_in_at_period, on=['PLAYER_ID', 'PERIOD'], how='left')
-        joined_players = joined_players[pd.isnull(joined_players['SUB'])][
-            ['PLAYER_NAME', 'PLAYER_ID', 'TEAM_ID', 'PERIOD']]
-        row = frame_to_row(joined_players)
-        row.append(period)
         rows.append(row)
 
     players_on_court_at_start_of_period = pd.DataFrame(rows)
@@ -685,97 +860,117 @@ def players_at_period(pbp, game_id):
 
 
 def pap_loop(year, pbp):
+    stage = 'pap'
+    queue = job_utils.get_job_queue(year)
     beginning_string, ids = get_nba_game_ids(year)
-    game_id = ids[0]
 
     pap_file_dir = Path.cwd() / "DataPack"
     pap_file_short = f"pap_{year}.csv"
-    pap_file_full = pap_file_dir / pap_file_short
-
-    existing_data = None
+    pap_file_full = storage_utils.saved_path(pap_file_dir, pap_file_short)
 
     new_data_frames = []
-    columns = ["GAME_ID", "TEAM_ID_1", "TEAM_1_PLAYERS", "TEAM_ID_2", "TEAM_2_PLAYERS", "PERIOD"]
-    error_counter = 0
-
-    if os.path.isfile(pap_file_full):
-        existing_data = pd.read_csv(pap_file_full)[columns]
-        existing_game_ids = existing_data["GAME_ID"].drop_duplicates().tolist()
-        existing_game_ids = ["00" + str(item) if type(item) is not str else str(item) for item in existing_game_ids]
-        ids = [gid for gid in ids if gid not in existing_game_ids]
+    new_game_ids = []
+    columns = (["GAME_ID", "TEAM_ID_1"] + PAP_LINEUP_COLUMNS['TEAM_1_PLAYERS'] + ["TEAM_ID_2"] +
+               PAP_LINEUP_COLUMNS['TEAM_2_PLAYERS'] + ["PERIOD"])
 
-    if existing_data is None:
-        existing_data = players_at_period(pbp, game_id)[columns]
-        ids = ids[1:]
+    # Only games whose play-by-play has been saved can be parsed
+    ids = job_utils.sync_stage(queue, stage, ids, pap_file_full,
+                               lambda: saved_game_ids(pap_file_dir, pap_file_short), upstream='pbp')
+    # Index the play-by-play by game once, so each game below is a slice instead of a scan of the season
+    pbp = event_store_utils.as_store(pbp, 'reg_pbp')
 
+    queue.start(stage, ids)
     with keep.presenting():
-        for x in range(len(ids)):
-            if error_counter >= 5:
-                if new_data_frames:
-                    combined_new = pd.concat(new_data_frames, ignore_index=True)
-                    if existing_data is not None:
-                        existing_data['TEAM_1_PLAYERS'] = existing_data['TEAM_1_PLAYERS'].map(str)
-                        existing_data['TEAM_2_PLAYERS'] = existing_data['TEAM_2_PLAYERS'].map(str)
-                        all_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                             ignore_index=True).drop_duplicates()
-                    else:
-                        all_data = combined_new[columns]
-                    all_data.drop_duplicates(inplace=True)
-                    all_data['TEAM_1_PLAYERS'] = all_data['TEAM_1_PLAYERS'].map(ast.literal_eval)
-                    all_data['TEAM_2_PLAYERS'] = all_data['TEAM_2_PLAYERS'].map(ast.literal_eval)
-                    save_file(all_data, pap_file_dir, pap_file_short)
-                raise IndexError("Too many consecutive errors! Wrong game/s indexed?\n"
-                                 f"Max gid hit: {x - 1}. Writing current data and stopping...")
-
-            time.sleep(3)
-            game_id = ids[x]
+        for game_id in ids:
             try:
                 # Extract the pbp data
                 holder_pap = players_at_period(pbp, game_id)
                 if holder_pap is None:
-                    error_counter = 5
+                    queue.fail(stage, game_id, "No players found")
                     continue
 
-                holder_pap['TEAM_1_PLAYERS'] = holder_pap['TEAM_1_PLAYERS'].map(str)
-                holder_pap['TEAM_2_PLAYERS'] = holder_pap['TEAM_2_PLAYERS'].map(str)
+                holder_pap = expand_lineups(holder_pap, PAP_LINEUP_COLUMNS)
 
                 # Add this data on to the existing dataframe
                 new_data_frames.append(holder_pap[columns])
-                error_counter = 0
+                new_game_ids.append(game_id)
+            # Offline mode without the boxscore cached. The game stays pending for a run that can fetch it
+            except cache_utils.OfflineCacheMiss as e:
+                print(f"{game_id}: {e}")
+                queue.release(stage, [game_id])
             # Catch the case in which the URL doesn't exist (sometimes the game id skips a number)
-            except requests.exceptions.JSONDecodeError:
-                error_counter += 1
+            except (requests.exceptions.JSONDecodeError, json.JSONDecodeError) as e:
                 print("Game does not exist")
-            except ValueError:
-                error_counter += 1
-                print(f"Value Error/Missing Game for game id: {game_id}")
+                queue.fail(stage, game_id, e)
+            except Exception as e:
+                # One bad game is recorded and retried on the next run instead of stopping the whole season
+                print(f"{e!r} for game id: {game_id}")
+                queue.fail(stage, game_id, e)
+
+    report_dead_letters(queue, stage)
 
     if new_data_frames:
-        combined_new = pd.concat(new_data_frames, ignore_index=True)
-        if existing_data is not None:
-            existing_data['TEAM_1_PLAYERS'] = existing_data['TEAM_1_PLAYERS'].map(str)
-            existing_data['TEAM_2_PLAYERS'] = existing_data['TEAM_2_PLAYERS'].map(str)
-            existing_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                      ignore_index=True).drop_duplicates()
-        else:
-            existing_data = combined_new[columns]
+        # Only the new games are written, each to its own segment of the season
+        combined_new = pd.concat(new_data_frames, ignore_index=True).drop_duplicates()
+        storage_utils.append_games(combined_new, pap_file_dir, pap_file_short)
+        queue.done(stage, new_game_ids)
+    elif not storage_utils.exists(pap_file_dir, pap_file_short):
+        return None
+
+    pap = expand_lineups(storage_utils.read(pap_file_dir, pap_file_short), PAP_LINEUP_COLUMNS)
+    return pap[columns]
+
 
-    existing_data = existing_data.drop_duplicates()
-    existing_data['TEAM_1_PLAYERS'] = existing_data['TEAM_1_PLAYERS'].map(ast.literal_eval)
-    existing_data['TEAM_2_PLAYERS'] = existing_data['TEAM_2_PLAYERS'].map(ast.literal_eval)
+# Lineups are stored as five int64 player id columns per team (e.g. TEAM_1_PLAYER_1 ... TEAM_1_PLAYER_5), sorted by
+# player id, so the possession engine and lineup group-bys never have to parse them
+def lineup_columns(template):
+    return [template.format(i) for i in range(1, 6)]
 
-    pap = existing_data.reset_index()
-    pap = pap.drop(columns=['level_0', 'index'], errors='ignore')
 
-    save_file(pap, pap_file_dir, pap_file_short)
-    return pap
+PAP_LINEUP_COLUMNS = {'TEAM_1_PLAYERS': lineup_columns('TEAM_1_PLAYER_{}'),
+                      'TEAM_2_PLAYERS': lineup_columns('TEAM_2_PLAYER_{}')}
+POSSESSION_LINEUP_COLUMNS = {'team_1_players': lineup_columns('team_1_player_{}'),
+                             'team_2_players': lineup_columns('team_2_player_{}')}
 
 
-# Players at the start of each period are stored as a string in the dataframe column
-# We need to parse out that string into an array of player Ids
-def split_row(list_str):
-    list_str = str(list_str)
-    return [x.replace('[', '').replace(']', '').strip() for x in list_str.split(',')]
+def expand_lineups(frame, lineup_columns_map):
+    """
+    Replace lineup list columns with five player id columns each. Files written before lineups had their own columns
+    hold the string form of the list (e.g. "[1, 2, 3, 4, 5]" or "['1', '2', '3', '4', '5']"), which is parsed here once.
+    Parameters
+    ----------
+    frame : pandas.DataFrame
+    lineup_columns_map : dict
+        List column -> its five player id columns, e.g. PAP_LINEUP_COLUMNS
+
+    Returns
+    -------
+    The dataframe without the list columns
+    """
+    for list_column, columns in lineup_columns_map.items():
+        if list_column not in frame.columns:
+            continue
+        lineups = frame[list_column]
+        has_lineup = lineups.notna()
+        if not has_lineup.any():
+            frame = frame.drop(columns=[list_column])
+            continue
+        if isinstance(lineups[has_lineup].iloc[0], str):
+            players = lineups[has_lineup].str.replace(r"[\[\]'\s]", '', regex=True).str.split(',', expand=True)
+        else:
+            players = pd.DataFrame(lineups[has_lineup].tolist(), index=lineups[has_lineup].index)
+        if players.shape[1] > len(columns):
+            raise ValueError(f"More than {len(columns)} players in a {list_column} lineup")
+        players = players.reindex(columns=range(len(columns))).apply(pd.to_numeric).astype('Int64')
+        players.columns = columns
+        # Rows read from a file with both layouts already have the player columns
+        for column in columns:
+            if column in frame.columns:
+                frame[column] = frame[column].astype('Int64').where(~has_lineup, players[column])
+            else:
+                frame[column] = players[column].reindex(frame.index)
+        frame = frame.drop(columns=[list_column])
+    return frame
 
 
 # We will need to know the game clock at each event later on. Let's take the game clock string (7:34) and convert
@@ -820,8 +1015,8 @@ def update_subs(sub_map, row):
     # If the event is a substitution we need to sub out the players on the court
     if pbp_utils.is_substitution(row):
         team_id = row[pbp_utils.player1_team_id]
-        player_in = str(row[pbp_utils.player2_id])
-        player_out = str(row[pbp_utils.player1_id])
+        player_in = int(row[pbp_utils.player2_id])
+        player_out = int(row[pbp_utils.player1_id])
         players = sub_map[period][team_id]
         players_index = players.index(player_out)
         players[players_index] = player_in
@@ -914,7 +1109,7 @@ def extract_points(p):
 # improvements can be made by handling each event type individually
 def determine_possession_team(p, team1, team2):
     if pbp_utils.is_made_shot(p) or pbp_utils.is_free_throw(p):
-        return str(int(p[pbp_utils.player1_team_id]))
+        return int(p[pbp_utils.player1_team_id])
     elif pbp_utils.is_rebound(p):
         if pbp_utils.is_team_rebound(p):
             if p[pbp_utils.player1_id] == team1:
@@ -928,14 +1123,14 @@ def determine_possession_team(p, team1, team2):
                 return team1
     elif pbp_utils.is_turnover(p):
         if pbp_utils.is_team_turnover(p):
-            return str(int(p[pbp_utils.player1_id]))
+            return int(p[pbp_utils.player1_id])
         else:
-            return str(int(p[pbp_utils.player1_team_id]))
+            return int(p[pbp_utils.player1_team_id])
     else:
-        if math.isnan(p[pbp_utils.player1_team_id]):
-            return str(int(p[pbp_utils.player1_id]))
+        if pd.isna(p[pbp_utils.player1_team_id]):
+            return int(p[pbp_utils.player1_id])
         else:
-            return str(int(p[pbp_utils.player1_team_id]))
+            return int(p[pbp_utils.player1_team_id])
 
 
 # Parse out the list of events in a possession into a single possession object for this tutorial we will only
@@ -950,30 +1145,28 @@ def parse_possession(possession):
     period = event_data[pbp_utils.period_column]
 
     team1_id = event_data['TEAM1_ID']
-    team1_players = []
-    for i in range(1, 6):
-        player_key = f'TEAM1_PLAYER{i}'
-        team1_players.append(event_data.get(player_key))
     team1_points = points[team1_id] if team1_id in points else 0
 
     team2_id = event_data['TEAM2_ID']
-    team2_players = []
-    for i in range(1, 6):
-        player_key = f'TEAM2_PLAYER{i}'
-        team2_players.append(event_data.get(player_key))
     team2_points = points[team2_id] if team2_id in points else 0
 
     possession_team = determine_possession_team(possession[-1], team1_id, team2_id)
     game_id = event_data['GAME_ID']
     event_num = event_data['EVENTNUM']
 
+    # Each team's five players get a column of their own
+    lineups = {}
+    for team in (1, 2):
+        for i, column in enumerate(POSSESSION_LINEUP_COLUMNS[f'team_{team}_players'], start=1):
+            lineups[column] = event_data.get(f'TEAM{team}_PLAYER{i}')
+
     return {
         'GAME_ID': game_id,
         'EVENTNUM': event_num,
         'team_1_id': team1_id,
-        'team_1_players': team1_players,
+        **{column: lineups[column] for column in POSSESSION_LINEUP_COLUMNS['team_1_players']},
         'team_2_id': team2_id,
-        'team_2_players': team2_players,
+        **{column: lineups[column] for column in POSSESSION_LINEUP_COLUMNS['team_2_players']},
         'game_id': game_id,
         'period': period,
         'possession_start': possession_start,
@@ -986,8 +1179,12 @@ def parse_possession(possession):
 
 def pos_parser(big_pbp, big_pap, game_id):
     # Read in play by play and fill null description columsn with empty string
-    play_by_play = big_pbp.loc[big_pbp['GAME_ID'] == int(game_id)]
+    play_by_play = event_store_utils.game_events(big_pbp, game_id)
     play_by_play = play_by_play.reset_index(drop=True)
+    # The engine looks at one event at a time, where a missing id has to compare like NaN (unequal to everything)
+    # instead of raising like pd.NA
+    play_by_play = play_by_play.astype({column: 'float64' for column, dtype in play_by_play.dtypes.items()
+                                        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iu'})
     play_by_play[pbp_utils.home_description] = play_by_play[pbp_utils.home_description].fillna("")
     play_by_play[pbp_utils.neutral_description] = play_by_play[pbp_utils.neutral_description].fillna("")
     play_by_play[pbp_utils.away_description] = play_by_play[pbp_utils.away_description].fillna("")
@@ -997,15 +1194,18 @@ def pos_parser(big_pbp, big_pap, game_id):
     play_by_play[pbp_utils.time_elapsed_period] = play_by_play.apply(calculate_time_elapsed_period, axis=1)
 
     # Read the players at the start of each period
-    players_at_start_of_period = big_pap.loc[big_pap['GAME_ID'] == int(game_id)]
+    players_at_start_of_period = event_store_utils.game_events(big_pap, game_id)
 
     # We need to keep track of substitutions as they happen. To do this we will maintain a map of players on the
     # court at a given moment It will be structured as period -> team_id -> players array
     sub_map = {}
     # Pre-populate the map with the players at the start of each period
+    team_1_columns = PAP_LINEUP_COLUMNS['TEAM_1_PLAYERS']
+    team_2_columns = PAP_LINEUP_COLUMNS['TEAM_2_PLAYERS']
     for row in players_at_start_of_period.iterrows():
-        sub_map[row[1][pbp_utils.period_column]] = {row[1]['TEAM_ID_1']: split_row(row[1]['TEAM_1_PLAYERS']),
-                                                    row[1]['TEAM_ID_2']: split_row(row[1]['TEAM_2_PLAYERS'])}
+        sub_map[row[1][pbp_utils.period_column]] = {
+            row[1]['TEAM_ID_1']: sorted(int(player) for player in row[1][team_1_columns]),
+            row[1]['TEAM_ID_2']: sorted(int(player) for player in row[1][team_2_columns])}
 
     # convert dataframe into a list of rows. I know there is a better way to do this,
     # but this is the first thing I thought of.
@@ -1041,90 +1241,76 @@ def pc_to_sec(row):
 
 
 def possession_parser_loop(year, big_pbp, big_pap):
-    # game_id starting string. This changes from year-to-year.
-    # game_id = id_getter[year][0] + "000" + str(id_getter[year][1][0]-1)
+    stage = 'possessions'
+    queue = job_utils.get_job_queue(year)
     beginning_string, ids = get_nba_game_ids(year)
-    # x = 1
-    # game_id = beginning_string + "".join(["0" for y in range(5 - len(str(x)))]) + str(x)
-    game_id = ids[0]
 
     dirname = Path.cwd() / "DataPack"
     filename = f"full_reg_pbp_{year}.csv"
-    full_filename = dirname / filename
+    full_filename = storage_utils.saved_path(dirname, filename)
 
-    existing_data = None
     new_data_frames = []
-    columns = ['GAME_ID', 'EVENTNUM', 'team_1_id', 'team_1_players', 'team_2_id',
-               'team_2_players', 'period', 'possession_start',
-               'possession_end', 'team_1_points', 'team_2_points', 'possession_team', 'possession_id']
-    error_counter = 0
-
-    if os.path.isfile(full_filename):
-        existing_data = pd.read_csv(full_filename)[columns]
-        existing_game_ids = existing_data["GAME_ID"].drop_duplicates().tolist()
-        existing_game_ids = ["00" + str(item) if type(item) is not str else str(item) for item in existing_game_ids]
-        ids = [gid for gid in ids if gid not in existing_game_ids]
-
-    if existing_data is None:
-        existing_data = pos_parser(big_pbp, big_pap, game_id)
-        existing_data['possession_id'] = existing_data.index.values + 1
-        ids = ids[1:]
-
+    new_game_ids = []
+    lineup_columns_1 = POSSESSION_LINEUP_COLUMNS['team_1_players']
+    lineup_columns_2 = POSSESSION_LINEUP_COLUMNS['team_2_players']
+    columns = (['GAME_ID', 'EVENTNUM', 'team_1_id'] + lineup_columns_1 + ['team_2_id'] + lineup_columns_2 +
+               ['period', 'possession_start', 'possession_end', 'team_1_points', 'team_2_points', 'possession_team',
+                'possession_id'])
+
+    # Only games whose players at each period have been saved can be parsed
+    ids = job_utils.sync_stage(queue, stage, ids, full_filename, lambda: saved_game_ids(dirname, filename),
+                               upstream='pap')
+    # Index both inputs by game once, so each game below is a slice instead of a scan of the season
+    big_pbp = event_store_utils.as_store(big_pbp, 'reg_pbp')
+    big_pap = event_store_utils.as_store(big_pap, 'pap')
+
+    queue.start(stage, ids)
     with keep.presenting():
-        for x in range(len(ids)):
-            if error_counter >= 5:
-                if new_data_frames:
-                    combined_new = pd.concat(new_data_frames, ignore_index=True)
-                    combined_new['team_1_players'] = combined_new['team_1_players'].astype(str)
-                    combined_new['team_2_players'] = combined_new['team_2_players'].astype(str)
-                    if existing_data is not None:
-                        existing_data['team_1_players'] = existing_data['team_1_players'].astype(str)
-                        existing_data['team_2_players'] = existing_data['team_2_players'].astype(str)
-                        all_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                             ignore_index=True).drop_duplicates()
-                    else:
-                        all_data = combined_new[columns]
-                    all_data.drop_duplicates(inplace=True)
-                    save_file(all_data, dirname, filename)
-                raise IndexError("Too many consecutive errors! Wrong game/s indexed?\n"
-                                 "Writing current data and stopping...")
-            # Update the game id depending on x
-            # game_id = beginning_string + "".join(["0" for y in range(5 - len(str(x)))]) + str(x)
-            game_id = ids[x]
+        for game_id in ids:
             try:
                 # Extract the pbp data
                 holder_poss = pos_parser(big_pbp, big_pap, game_id)
                 holder_poss['possession_id'] = holder_poss.index.values + 1
                 new_data_frames.append(holder_poss.reset_index()[columns])
+                new_game_ids.append(game_id)
 
+            # Offline mode without a page the parser needs cached. The game stays pending for a run that can fetch it
+            except cache_utils.OfflineCacheMiss as e:
+                print(f"{game_id}: {e}")
+                queue.release(stage, [game_id])
             # Catch the case in which the URL doesn't exist (sometimes the game id skips a number)
-            except IndexError:
+            except IndexError as e:
                 print(f"IE: Game {game_id} does not exist")
-            except ValueError:
+                queue.fail(stage, game_id, e)
+            except ValueError as e:
                 print(f"VE: Game {game_id} does not exist")
+                queue.fail(stage, game_id, e)
             except KeyError as k:
                 print(f"KE: {k} for game id {game_id}")
+                queue.fail(stage, game_id, k)
+            except Exception as e:
+                # One bad game is recorded and retried on the next run instead of stopping the whole season
+                print(f"{e!r} for game id {game_id}")
+                queue.fail(stage, game_id, e)
 
-    existing_data['team_1_players'] = existing_data['team_1_players'].astype(str)
-    existing_data['team_2_players'] = existing_data['team_2_players'].astype(str)
-    if new_data_frames:
-        combined_new = pd.concat(new_data_frames, ignore_index=True)
-        combined_new['team_1_players'] = combined_new['team_1_players'].astype(str)
-        combined_new['team_2_players'] = combined_new['team_2_players'].astype(str)
-        if existing_data is not None:
-            existing_data = pd.concat([existing_data[columns], combined_new[columns]],
-                                      ignore_index=True).drop_duplicates()
-        else:
-            existing_data = combined_new[columns]
+    report_dead_letters(queue, stage)
 
-    # Merge our dataframes together
-    poss = big_pbp.merge(existing_data, how="left", on=["GAME_ID", "EVENTNUM"])
+    if not new_data_frames:
+        if not storage_utils.exists(dirname, filename):
+            return None
+        return expand_lineups(storage_utils.read(dirname, filename), POSSESSION_LINEUP_COLUMNS)
+
+    new_possessions = pd.concat(new_data_frames, ignore_index=True)
+
+    # Merge our dataframes together. Only the new games are processed, the games already saved are left alone
+    new_pbp = big_pbp.games(new_possessions['GAME_ID'].unique()).reset_index(drop=True)
+    poss = new_pbp.merge(new_possessions, how="left", on=["GAME_ID", "EVENTNUM"])
 
     # Forward fill the NA values for the players who are on the court
     poss[columns] = \
         poss[columns].ffill()
 
-    poss = poss.drop_duplicates()
+    poss = poss.drop_duplicates().reset_index(drop=True)
 
     # Convert PCTIMESTRING into how many seconds into the game we are.
     poss['sec'] = poss.apply(pc_to_sec, axis=1)
@@ -1143,9 +1329,53 @@ def possession_parser_loop(year, big_pbp, big_pap):
             poss.at[i, 'possession_id'] = poss.at[i - 1, 'possession_id']
 
     poss['possession_id'] = poss['possession_id'].astype(int)
-    save_file(poss, dirname, filename)
+    poss[lineup_columns_1 + lineup_columns_2] = poss[lineup_columns_1 + lineup_columns_2].astype('Int64')
+    storage_utils.append_games(poss, dirname, filename)
+    queue.done(stage, new_game_ids)
+
+    return expand_lineups(storage_utils.read(dirname, filename), POSSESSION_LINEUP_COLUMNS)
+
 
-    return poss
+def scrape_espn_scoreboard(driver, game_date):
+    """
+    Get the links to every game on an ESPN scoreboard page
+    Parameters
+    ----------
+    driver : webdriver.Chrome
+    game_date : date
+
+    Returns
+    -------
+    A list of game links, or None if there were no games that day
+    """
+    link = f"https://www.espn.com/nba/scoreboard/_/date/{str(game_date).replace('-', '')}"
+    print(link)
+
+    driver.get(link)
+    wait = WebDriverWait(driver, 20)  # Maximum wait time of 20 seconds
+
+    xpath = '//div[contains(@class, "ScoreCell--md")]'
+
+    try:
+        score_cells = wait.until(EC.presence_of_all_elements_located((By.XPATH, xpath)))
+    except TimeoutException:
+        if len(driver.find_elements(By.CLASS_NAME, 'clr-gray-05')) == 0:
+            # Nothing loaded at all, so we are probably going too fast
+            raise
+        print(f"{game_date}: No games!")
+        return None
+
+    hrefs = []
+    try:
+        # Iterate through each instance and get the first link
+        for score_cell in score_cells:
+            link = score_cell.find_element(By.TAG_NAME, "a")
+            hrefs.append(link.get_attribute("href"))
+    except StaleElementReferenceException:
+        if len(driver.find_elements(By.CLASS_NAME, 'clr-gray-05')) != 0:
+            return None
+        raise
+    return hrefs
 
 
 def get_espn_schedule(year):
@@ -1163,66 +1393,156 @@ def get_espn_schedule(year):
     schedule = dict(sorted(schedule.items(), key=lambda x: x[0]))
 
     game_dates = list(schedule.keys())
-    driver = webdriver.Chrome()
+    # Scoreboards are loaded in parallel across the headless driver pool, paced by the adaptive controller for espn.com
+    pool = browser_utils.get_driver_pool()
+    controller = fetch_utils.get_rate_controller("www.espn.com")
     hrefs = {}
 
-    for game_date in game_dates:
-        hrefs[game_date] = []
-        link = f"https://www.espn.com/nba/scoreboard/_/date/{str(game_date).replace('-', '')}"
-        print(link)
+    for game_date, links, error in pool.map(scrape_espn_scoreboard, game_dates, controller=controller):
+        if error is not None:
+            print(f"{game_date}: {error!r} [{controller.rate:.2f} pages/s]")
+            hrefs[game_date] = []
+        elif links is not None:
+            hrefs[game_date] = links
 
-        driver.get(link)
-        wait = WebDriverWait(driver, 20)  # Maximum wait time of 10 seconds
-        time.sleep(2)
+    # Keep the dates in order
+    hrefs = {game_date: hrefs[game_date] for game_date in game_dates if game_date in hrefs}
 
-        pyautogui.hotkey('command', 'option', 'i')
+    dirname = "DataPack"
+    dirname = Path.cwd() / dirname / "ESPN"
+    filename = f"espn_schedule_{year}.json"
+    save_file(hrefs, dirname, filename)
+    return hrefs
 
-        xpath = '//div[contains(@class, "ScoreCell--md")]'
 
-        score_cells = None
+def espn_summary_url(href):
+    """
+    Get the ESPN summary API endpoint for a game page. The summary holds the same win probability and plays the
+    game page loads to draw its chart.
+    Parameters
+    ----------
+    href : String
+        The game page, e.g. https://www.espn.com/nba/game/_/gameId/401585601/...
 
-        try:
-            score_cells = wait.until(EC.presence_of_all_elements_located((By.XPATH, xpath)))
-        except TimeoutException:
-            no_games = driver.find_elements(By.CLASS_NAME, 'clr-gray-05')
-            print(no_games)
-            print(f"{game_date}: No games!")
-            if len(no_games) != 0:
-                del hrefs[game_date]
-                pyautogui.hotkey('command', 'option', 'i')
-                continue
+    Returns
+    -------
+    The URL
+    """
+    match = re.search(r'gameId[/=](\d+)', href)
+    if match is None:
+        raise ValueError(f"No ESPN game id in {href}")
+    return f"https://site.api.espn.com/apis/site/v2/sports/basketball/nba/summary?event={match.group(1)}"
 
-        try:
-            # Iterate through each instance and get the first link
-            for score_cell in score_cells:
-                link = score_cell.find_element(By.TAG_NAME, "a")
-                hrefs[game_date].append(link.get_attribute("href"))
-            pyautogui.hotkey('command', 'option', 'i')
-
-        except StaleElementReferenceException:
-            no_games = driver.find_elements(By.CLASS_NAME, 'clr-gray-05')
-            print(no_games)
-            if len(no_games) != 0:
-                del hrefs[game_date]
-                pyautogui.hotkey('command', 'option', 'i')
-                continue
 
-    driver.quit()
+def espn_clock_to_sec(period, clock):
+    """
+    Convert an ESPN period and game clock into seconds since the start of the game, the same way pc_to_sec does for
+    PCTIMESTRING
+    Parameters
+    ----------
+    period : int
+    clock : String
+        e.g. 11:32, or 45.2 in the last minute of a period
 
-    dirname = "DataPack"
-    dirname = Path.cwd() / dirname / "ESPN"
-    filename = f"espn_schedule_{year}.json"
-    save_file(hrefs, dirname, filename)
-    return hrefs
+    Returns
+    -------
+    The number of seconds elapsed
+    """
+    minutes, _, seconds = str(clock).rpartition(':')
+    # stats.nba.com drops the tenths of a second, so do the same to line the clocks up
+    remaining = 60 * int(minutes or 0) + int(float(seconds))
+    if period <= 4:
+        return 720 * (period - 1) + 720 - remaining
+    return 720 * 4 + 300 * (period - 5) + 300 - remaining
+
+
+def fetch_espn_win_probability(href):
+    """
+    Get the win probability after every play of a game from the ESPN summary API
+    Parameters
+    ----------
+    href : String
+        The game page
+
+    Returns
+    -------
+    A dataframe of seconds elapsed (sec) and home win probability (home_wp), the away team name and the home team name
+    """
+    content, changed, commit = get_page(espn_summary_url(href))
+    summary = schema_utils.load_json(content)
+
+    teams = {competitor['homeAway']: competitor['team']['displayName']
+             for competitor in summary['header']['competitions'][0]['competitors']}
+
+    plays = {play['id']: play for play in summary.get('plays', [])}
+    rows = []
+    for point in summary.get('winprobability', []):
+        play = plays.get(point.get('playId'))
+        if play is None:
+            continue
+        rows.append((espn_clock_to_sec(play['period']['number'], play['clock']['displayValue']),
+                     round(point['homeWinPercentage'], 3)))
+    if not rows:
+        raise ValueError(f"No win probability for {href}")
+
+    frame = pd.DataFrame(rows, columns=['sec', 'home_wp'])
+    # Keep the probability after the last play at each second
+    frame = frame.drop_duplicates(subset=['sec'], keep='last').reset_index(drop=True)
+    # Only cache a summary that parsed
+    commit()
+    return frame, teams['away'], teams['home']
+
+
+def scrape_espn_game(driver, href):
+    """
+    Get the win probability chart and the team names from an ESPN game page
+    Parameters
+    ----------
+    driver : webdriver.Chrome
+    href : String
+        The game page
+
+    Returns
+    -------
+    The d attribute of the win probability SVG path, the away team name and the home team name
+    """
+    print(href)
+    driver.get(href)
+
+    wait = WebDriverWait(driver, 10)  # Maximum wait time of 10 seconds
+
+    win_probability_button = wait.until(
+        EC.element_to_be_clickable((By.XPATH, '//button[contains(text(), "Win Probability")]'))
+    )
+    win_probability_button.click()
+
+    g_element = wait.until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, 'g[class="recharts-layer recharts-line"]'))
+    )
+
+    try:
+        path_element = g_element.find_element(By.TAG_NAME, 'path')
+        d_attribute = path_element.get_attribute('d')
+    except StaleElementReferenceException:
+        path_element = g_element.find_element(By.TAG_NAME, 'path')
+        d_attribute = path_element.get_attribute('d')
+
+    span_elements = driver.find_elements(By.XPATH, "//a[@data-testid='prism-linkbase']//span")
+
+    span_texts = [e.text for e in span_elements]
+    span_texts = [e for e in span_texts if e is not None and len(e.strip()) > 0]
+
+    return d_attribute, span_texts[0], span_texts[1]
 
 
 def scrape_espn_data(year, pbp_data):
     dirname = "DataPack"
-    existing_file = Path.cwd() / dirname / "ESPN" / f"espn_wp_{year}.csv"
+    espn_dir = Path.cwd() / dirname / "ESPN"
+    espn_wp_filename = f"espn_wp_{year}.csv"
     existing_data = None
     max_existing_date = date(1800, 1, 1)
-    if os.path.isfile(existing_file):
-        existing_data = pd.read_csv(existing_file)
+    if storage_utils.exists(espn_dir, espn_wp_filename):
+        existing_data = storage_utils.read(espn_dir, espn_wp_filename, columns=['GAME_DATE'])
         max_existing_date = pd.to_datetime(existing_data['GAME_DATE']).dt.date.max()
 
     espn_schedule_filename = f"espn_schedule_{year}.json"
@@ -1244,26 +1564,23 @@ def scrape_espn_data(year, pbp_data):
 
     hrefs = {str(k): v for k, v in hrefs.items() if today > k > max_existing_date}
 
-    driver = webdriver.Chrome()
     df_list = []
 
-    teams_per_game = (
-        pbp_data
+    # The games and their teams come from two columns of the season, read in one pass instead of once per game
+    pbp_data = event_store_utils.as_store(pbp_data, 'reg_pbp')
+    game_teams = (
+        pbp_data.columns(['GAME_ID', 'PLAYER1_TEAM_ID'])
         .dropna(subset=['PLAYER1_TEAM_ID'])
-        .groupby('GAME_ID', as_index=False)['PLAYER1_TEAM_ID']
-        .apply(lambda x: list(pd.unique(x))[:2])  # first 2 unique teams
-        .reset_index()
-        .rename(columns={'PLAYER1_TEAM_ID': 'teams'})
-    )
-
-    teams_per_game[['team1', 'team2']] = (
-        pd.DataFrame(teams_per_game['teams'].tolist(), index=teams_per_game.index)
+        .drop_duplicates()
     )
-    unique_games = (
-        pbp_data
-        .groupby('GAME_ID', as_index=False)
-        .head(1)[['GAME_ID']]
+    # first 2 unique teams
+    team_order = game_teams.groupby('GAME_ID').cumcount()
+    teams_per_game = (
+        game_teams.loc[team_order == 0].rename(columns={'PLAYER1_TEAM_ID': 'team1'})
+        .merge(game_teams.loc[team_order == 1].rename(columns={'PLAYER1_TEAM_ID': 'team2'}), on='GAME_ID',
+               how='left')
     )
+    unique_games = pd.DataFrame({'GAME_ID': pbp_data.game_ids()})
 
     unique_games = unique_games.merge(
         teams_per_game[['GAME_ID', 'team1', 'team2']],
@@ -1310,63 +1627,61 @@ def scrape_espn_data(year, pbp_data):
     team_names.columns = ['team2_abbr', 'team2_name']
     unique_games = unique_games.merge(team_names, on=['team2_abbr'])
 
-    with keep.presenting():
-        for game_date in list(hrefs.keys()):
-            for href in hrefs[game_date]:
-                print(href)
-                driver.get(href)
-
-                wait = WebDriverWait(driver, 10)  # Maximum wait time of 10 seconds
+    def add_game_info(iteration_df, game_date, away_tm, home_tm):
+        iteration_df['GAME_DATE'] = game_date
+        iteration_df['away_tm'] = away_tm
+        iteration_df['away_tm_abbr'] = nba_team_name_map_inverted[away_tm]
+        iteration_df['home_tm'] = home_tm
+        iteration_df['home_tm_abbr'] = nba_team_name_map_inverted[home_tm]
 
-                win_probability_button = wait.until(
-                    EC.element_to_be_clickable((By.XPATH, '//button[contains(text(), "Win Probability")]'))
-                )
-                win_probability_button.click()
+        iteration_df['GAME_ID'] = unique_games[(unique_games['Date'].astype(str) == str(game_date)) &
+                                               (unique_games['team1_name'].isin([away_tm, home_tm])) &
+                                               (unique_games['team2_name'].isin([away_tm, home_tm]))][
+            'GAME_ID'].iloc[0]
 
-                g_element = wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'g[class="recharts-layer recharts-line"]'))
-                )
-
-                try:
-                    path_element = g_element.find_element(By.TAG_NAME, 'path')
-                    d_attribute = path_element.get_attribute('d')
-                #         d_attribute = driver.execute_script("return arguments[0].getAttribute('d');", path_element)
-                except StaleElementReferenceException:
-                    path_element = g_element.find_element(By.TAG_NAME, 'path')
-                    d_attribute = path_element.get_attribute('d')
+        # Append the current iteration's DataFrame to the main DataFrame
+        df_list.append(iteration_df)
 
-                span_elements = driver.find_elements(By.XPATH, "//a[@data-testid='prism-linkbase']//span")
+    pages = [(game_date, href) for game_date in hrefs for href in hrefs[game_date]]
 
-                span_texts = [e.text for e in span_elements]
-                span_texts = [e for e in span_texts if e is not None and len(e.strip()) > 0]
-
-                away_tm = span_texts[0]
-                home_tm = span_texts[1]
-
-                path_segments = d_attribute[1:].replace('C',
-                                                        ',')  # Skip the first element as it is before the first 'C'
+    # First try the JSON behind the win probability chart, which has the real game clock for every play and needs no
+    # browser at all
+    svg_pages = []
+    with keep.presenting():
+        for (game_date, href), game, error in fetch_utils.fetch_concurrently(
+                pages, lambda page: fetch_espn_win_probability(page[1]), workers=4):
+            if error is not None:
+                print(f"{href}: {error!r}, falling back to the chart")
+                svg_pages.append((game_date, href))
+                continue
+            iteration_df, away_tm, home_tm = game
+            iteration_df['wp_source'] = 'json'
+            add_game_info(iteration_df, game_date, away_tm, home_tm)
 
-                data_array = np.fromstring(path_segments, sep=',')
+    # Scrape the chart itself for the games the JSON didn't cover. These pages are loaded in parallel across the
+    # headless driver pool.
+    pool = browser_utils.get_driver_pool()
+    controller = fetch_utils.get_rate_controller("www.espn.com")
 
-                # Reshape the array to have two columns
-                reshaped_array = data_array.reshape(-1, 2)
+    with keep.presenting():
+        for (game_date, href), page, error in pool.map(lambda driver, page: scrape_espn_game(driver, page[1]),
+                                                      svg_pages, controller=controller):
+            if error is not None:
+                print(f"{href}: {error!r}")
+                continue
+            d_attribute, away_tm, home_tm = page
 
-                iteration_df = pd.DataFrame(data=reshaped_array, columns=['time', 'wp_h'])
-                iteration_df['GAME_DATE'] = game_date
-                iteration_df['away_tm'] = away_tm
-                iteration_df['away_tm_abbr'] = nba_team_name_map_inverted[away_tm]
-                iteration_df['home_tm'] = home_tm
-                iteration_df['home_tm_abbr'] = nba_team_name_map_inverted[home_tm]
+            path_segments = d_attribute[1:].replace('C',
+                                                    ',')  # Skip the first element as it is before the first 'C'
 
-                iteration_df['GAME_ID'] = unique_games[(unique_games['Date'].astype(str) == str(game_date)) &
-                                                       (unique_games['team1_name'].isin([away_tm, home_tm])) &
-                                                       (unique_games['team2_name'].isin([away_tm, home_tm]))][
-                    'GAME_ID'].iloc[0]
+            data_array = np.fromstring(path_segments, sep=',')
 
-                # Append the current iteration's DataFrame to the main DataFrame
-                df_list.append(iteration_df)
+            # Reshape the array to have two columns
+            reshaped_array = data_array.reshape(-1, 2)
 
-    driver.quit()
+            iteration_df = pd.DataFrame(data=reshaped_array, columns=['time', 'wp_h'])
+            iteration_df['wp_source'] = 'svg'
+            add_game_info(iteration_df, game_date, away_tm, home_tm)
 
     if len(df_list) == 0:
         print("No new games!")
@@ -1377,28 +1692,22 @@ def scrape_espn_data(year, pbp_data):
     df_new['away_tm'] = df_new['away_tm'].map(tm_changes).fillna(df_new['away_tm'])
     df_new['home_tm'] = df_new['home_tm'].map(tm_changes).fillna(df_new['home_tm'])
 
-    if existing_data is not None:
-        df_new = pd.concat([existing_data, df_new], axis=0)
-
-    dirname = "DataPack"
-    dirname = Path.cwd() / dirname / "ESPN"
-    filename = f"espn_wp_{year}.csv"
-    save_file(df_new, dirname, filename)
+    # Only the new games are written
+    storage_utils.append_games(df_new, espn_dir, espn_wp_filename)
 
 
 def combine_espn_data(year):
     pd.options.mode.chained_assignment = None
     dirname = "DataPack"
     filename = f"full_reg_pbp_{year}.csv"
-    poss_path = Path.cwd() / dirname / filename
-    poss = pd.read_csv(poss_path)
+    poss = expand_lineups(storage_utils.read(Path.cwd() / dirname, filename), POSSESSION_LINEUP_COLUMNS)
     poss['sec'] = poss['sec'].astype(float)
     espn_filename = f"espn_wp_{year}.csv"
-    espn_path = Path.cwd() / dirname / "ESPN" / espn_filename
-    espn = pd.read_csv(espn_path)
+    # Each game's win probability is a slice of the memory-mapped ESPN season
+    espn = event_store_utils.open_store(Path.cwd() / dirname / "ESPN", espn_filename)
     grouped_poss = poss.groupby('GAME_ID')
 
-    poss['GAME_DATE'] = np.nan
+    poss['GAME_DATE'] = None
     poss['away_tm'] = ''
     poss['away_tm_abbr'] = ''
     poss['home_tm'] = ''
@@ -1413,18 +1722,26 @@ def combine_espn_data(year):
     # Iterate through each group
     for group_name, group_df in grouped_poss:
         # Iterate through rows within the group and fill NA values in columns c and d
-        holder = espn.loc[espn['GAME_ID'] == group_df['GAME_ID'].iloc[0]]
+        holder = espn.game(group_df['GAME_ID'].iloc[0])
+        # Files written before the JSON win probability only have the chart coordinates
+        for column in ('time', 'wp_h', 'sec', 'home_wp'):
+            if column not in holder.columns:
+                holder[column] = np.nan
+        if 'wp_source' not in holder.columns:
+            holder['wp_source'] = 'svg'
         group_df = group_df.drop(
             columns=['GAME_DATE', 'away_tm', 'away_tm_abbr', 'home_tm', 'home_tm_abbr', 'home_wp', 'road_wp', 'home_wp_prev', 'road_wp_prev',
                      'home_wpa', 'road_wpa'])
 
-        max_time = group_df['sec'].max()
-        max_espn_time = holder['time'].max()
-        holder['home_wp'] = round((holder['wp_h'] - 5) / (205 - 5), 3)
+        if (holder['wp_source'] != 'json').any():
+            # The chart only gives pixel coordinates, so stretch them over the length of the game
+            max_time = group_df['sec'].max()
+            max_espn_time = holder['time'].max()
+            holder['home_wp'] = round((holder['wp_h'] - 5) / (205 - 5), 3)
+            holder['sec'] = round(max_time * (holder['time'] - 5) / (max_espn_time - 5), 3)
         holder['road_wp'] = round(1 - holder['home_wp'], 3)
-        holder['sec'] = round(max_time * (holder['time'] - 5) / (max_espn_time - 5), 3)
 
-        holder = holder.drop(columns=['wp_h', 'time'])
+        holder = holder.drop(columns=['wp_h', 'time', 'wp_source'])
 
         group_df['copy_index'] = group_df.index
         group_df = group_df.merge(holder, on=['GAME_ID', 'sec'], how='left')
@@ -1447,15 +1764,20 @@ def combine_espn_data(year):
     save_file(poss, dirname, filename_out)
 
 
-def get_all_data(year, espn):
-    get_nba_stats_data(year)
-    get_bbref_data(year)
-    id_matching(year)
+def get_all_data(year, espn, offline=False):
+    # In offline mode every request is served from the on-disk response cache
+    cache_utils.set_offline(offline)
+    stats_changed = get_nba_stats_data(year)
+    bbref_changed = get_bbref_data(year)
+    # Only redo the id matching if one of its inputs changed
+    if stats_changed or bbref_changed or not os.path.isfile(Path.cwd() / "DataPack" / f"id_matches_{year}.csv"):
+        id_matching(year)
     get_nba_schedule(year)
     base_pbp = scrape_nba_pbp(year)
     base_pap = pap_loop(year, base_pbp)
     possession_parser_loop(year, base_pbp, base_pap)
 
     if espn:
+        espn_utils.update_espn_ids(year)
         scrape_espn_data(year, base_pbp)
         combine_espn_data(year)
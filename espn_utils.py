@@ -0,0 +1,159 @@
+import os
+from html.parser import HTMLParser
+from pathlib import Path
+
+import pandas as pd
+
+import fetch_utils
+
+# ESPN's team abbreviations, which differ from stats.nba.com for a few teams
+ESPN_TEAM_ABBRS = ['ATL', 'BKN', 'BOS', 'CHA', 'CLE', 'CHI', 'DAL', 'DEN', 'DET', 'GSW', 'HOU', 'IND', 'LAC', 'LAL',
+                   'MEM', 'MIA', 'MIL', 'MIN', 'NO', 'NY', 'OKC', 'ORL', 'PHI', 'PHX', 'POR', 'SA', 'SAC', 'TOR',
+                   'UTAH', 'WSH']
+
+ID_COLUMNS = ['espn_link', 'espn_name', 'team', 'position', 'espn_id']
+
+
+def team_stats_url(abbr, year):
+    """
+    Get an ESPN team's regular season player stats page
+    Parameters
+    ----------
+    abbr : String
+        ESPN team abbreviation
+    year : int
+        The year the season starts in
+
+    Returns
+    -------
+    The URL
+    """
+    return f"https://www.espn.com/nba/team/stats/_/name/{abbr}/season/{year + 1}/seasontype/2"
+
+
+def espn_id_from_link(link):
+    """
+    Get the player id from an ESPN player link
+    Parameters
+    ----------
+    link : String
+        e.g. https://www.espn.com/nba/player/_/id/4277905/trae-young
+
+    Returns
+    -------
+    The id, e.g. 4277905
+    """
+    parts = link.split('/')
+    return parts[parts.index('id') + 1]
+
+
+class PlayerLinkParser(HTMLParser):
+    """
+    Collect the player links of an ESPN team stats page. Each player cell looks like
+    <td><span><a href="...">Name</a><span>G</span></span></td>, where the inner span is the position.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.players = []
+        self.capture = None
+
+    def handle_starttag(self, tag, attrs):
+        in_player_cell = self.stack[-2:] == ['td', 'span']
+        self.stack.append(tag)
+        if not in_player_cell:
+            return
+        if tag == 'a':
+            self.players.append({'espn_link': dict(attrs).get('href'), 'espn_name': '', 'position': ''})
+            self.capture = 'espn_name'
+        elif tag == 'span' and self.players and self.players[-1]['position'] == '':
+            self.capture = 'position'
+
+    def handle_endtag(self, tag):
+        # Pop back to the matching tag, HTML pages don't always close everything
+        if tag in self.stack:
+            while self.stack.pop() != tag:
+                pass
+        if tag in ('a', 'span'):
+            self.capture = None
+
+    def handle_data(self, data):
+        if self.capture is not None:
+            self.players[-1][self.capture] += data
+
+
+def parse_player_links(content, abbr):
+    """
+    Get the players on an ESPN team stats page
+    Parameters
+    ----------
+    content : bytes
+        The page
+    abbr : String
+        The team abbreviation
+
+    Returns
+    -------
+    A dataframe with the ID_COLUMNS
+    """
+    parser = PlayerLinkParser()
+    parser.feed(content.decode('utf-8', errors='replace'))
+    parser.close()
+
+    frame = pd.DataFrame(parser.players, columns=['espn_link', 'espn_name', 'position'])
+    frame = frame.dropna(subset=['espn_link'])
+    frame = frame[frame['espn_link'].str.contains('/player/')].drop_duplicates(subset=['espn_link'])
+    frame['espn_name'] = frame['espn_name'].str.strip()
+    frame['position'] = frame['position'].str.strip()
+    frame['team'] = abbr
+    frame['espn_id'] = frame['espn_link'].map(espn_id_from_link)
+    return frame[ID_COLUMNS]
+
+
+def fetch_team_players(job):
+    abbr, year = job
+    return fetch_utils.get_cached(team_stats_url(abbr, year), lambda content: parse_player_links(content, abbr))
+
+
+def espn_ids_path(year):
+    return Path.cwd() / "DataPack" / "ESPN" / f"nba_ESPNIDs_{year}_{year + 1}.csv"
+
+
+def update_espn_ids(year, workers=4):
+    """
+    Crawl the 30 ESPN team stats pages for a season and merge the players into the season's ESPN id table. The pages
+    are fetched concurrently through the shared espn.com rate controller. Players are unique by ESPN id; a player who
+    changed teams keeps the team from the latest crawl, and players from earlier crawls are kept.
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    workers : int
+        Maximum number of requests in flight at once
+
+    Returns
+    -------
+    The id table
+    """
+    path = espn_ids_path(year)
+    frames = []
+    if os.path.isfile(path):
+        frames.append(pd.read_csv(path, dtype={'espn_id': str}))
+
+    jobs = [(abbr, year) for abbr in ESPN_TEAM_ABBRS]
+    for (abbr, _), players, error in fetch_utils.fetch_concurrently(jobs, fetch_team_players, workers=workers):
+        if error is not None:
+            print(f"{abbr}: {error!r}")
+            continue
+        frames.append(players)
+
+    if not frames:
+        return pd.DataFrame(columns=ID_COLUMNS)
+
+    ids = pd.concat(frames, ignore_index=True)[ID_COLUMNS]
+    ids = ids.drop_duplicates(subset=['espn_id'], keep='last').sort_values(['team', 'espn_name'], ignore_index=True)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ids.to_csv(path, index=False)
+    return ids
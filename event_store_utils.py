@@ -0,0 +1,259 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import schema_utils
+import storage_utils
+
+# Every store is sorted by game, so the events of a game are one run of rows. Within a game the events keep the order
+# they were saved in: the API lists them in game order, which EVENTNUM doesn't always follow (a substitution logged
+# late gets a later EVENTNUM than the plays after it).
+SORT_COLUMNS = ['GAME_ID']
+
+# Name of the event file kept next to a Parquet season's manifest
+EVENT_FILE = "events.arrow"
+
+# Key of our own entry in the event file's schema metadata
+METADATA_KEY = b'nba_stats_events'
+
+
+def game_offsets(game_ids):
+    """
+    Get the rows of every game in a column of game ids that is already sorted
+    Parameters
+    ----------
+    game_ids : numpy array
+
+    Returns
+    -------
+    A dictionary of game id -> (start, end) row numbers, where end is one past the game's last row
+    """
+    game_ids = np.asarray(game_ids)
+    if len(game_ids) == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, game_ids[1:] != game_ids[:-1]])
+    ends = np.r_[starts[1:], len(game_ids)]
+    return {int(gid): (int(start), int(end)) for gid, start, end in zip(game_ids[starts], starts, ends)}
+
+
+def sort_events(table):
+    # The sort is stable, so the rows of a game keep their order
+    table = table.sort_by([(column, 'ascending') for column in SORT_COLUMNS])
+    # An event file holds a single dictionary per column, so category columns need one dictionary for every chunk
+    return table.unify_dictionaries().combine_chunks()
+
+
+class EventStore:
+    """
+    A season of events sorted by GAME_ID, with the (start, end) rows of every game. The events of a game
+    are a zero-copy slice of the table instead of a scan of the whole season. A store opened with open_store is
+    memory-mapped from its event file, so processes working on the same season share the same pages.
+    Parameters
+    ----------
+    table : pyarrow Table
+        The events, already sorted
+    offsets : dict
+        Game id -> (start, end) rows. Worked out from the table if not given
+    dataset : String
+        The dataset name, e.g. reg_pbp, whose schema the dataframes get
+    """
+
+    def __init__(self, table, offsets=None, dataset=None):
+        self.table = table
+        self.offsets = offsets if offsets is not None else game_offsets(table.column('GAME_ID').to_numpy())
+        self.dataset = dataset
+
+    @classmethod
+    def from_frame(cls, frame, dataset=None):
+        """
+        Build a store in memory from a dataframe that is not saved anywhere
+        """
+        return cls(sort_events(storage_utils.to_arrow(frame)), dataset=dataset)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __contains__(self, game_id):
+        return int(game_id) in self.offsets
+
+    def game_ids(self):
+        return list(self.offsets)
+
+    def span(self, game_id):
+        # A game that isn't in the store is an empty slice, like a filter that matched nothing
+        return self.offsets.get(int(game_id), (0, 0))
+
+    def game_table(self, game_id):
+        start, end = self.span(game_id)
+        return self.table.slice(start, end - start)
+
+    def to_frame(self, table):
+        # Game slices are small, so the columns are not consolidated into blocks
+        return schema_utils.apply_schema(table.to_pandas(split_blocks=True), self.dataset or {})
+
+    def game(self, game_id):
+        """
+        Get the events of one game
+        Parameters
+        ----------
+        game_id : String or int
+
+        Returns
+        -------
+        The dataframe, in event order. Only the game's rows are converted, whatever the size of the season.
+        """
+        return self.to_frame(self.game_table(game_id))
+
+    def games(self, game_ids):
+        """
+        Get the events of several games, in the order the games are given
+        """
+        tables = [self.game_table(game_id) for game_id in game_ids]
+        if not tables:
+            return self.to_frame(self.table.slice(0, 0))
+        return self.to_frame(pa.concat_tables(tables))
+
+    def columns(self, columns):
+        """
+        Get a few columns of every event, e.g. to group the whole season by game
+        """
+        return self.to_frame(self.table.select(columns))
+
+
+def as_store(events, dataset=None):
+    """
+    Get a store for events that may be a store already or a dataframe. A dataframe is sorted and indexed once here,
+    so loops over games should call this before the loop, not for every game.
+    """
+    if isinstance(events, EventStore):
+        return events
+    return EventStore.from_frame(events, dataset)
+
+
+def game_events(events, game_id):
+    """
+    Get the events of one game from a store, or from a dataframe by scanning it
+    Parameters
+    ----------
+    events : EventStore or pandas DataFrame
+    game_id : String or int
+
+    Returns
+    -------
+    The dataframe
+    """
+    if isinstance(events, EventStore):
+        return events.game(game_id)
+    return events.loc[events['GAME_ID'] == int(game_id)]
+
+
+def event_path(directory, filename):
+    """
+    Get where the event file of a dataset file is kept
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The path, e.g. DataPack/reg_pbp/season=2023/events.arrow
+    """
+    if storage_utils.storage_format(filename) == 'parquet':
+        dataset, season = storage_utils.split_filename(filename)
+        return storage_utils.season_dir(directory, dataset, season) / EVENT_FILE
+    return Path(directory) / f"{Path(filename).stem}.arrow"
+
+
+def source_version(directory, filename):
+    """
+    Get what identifies the saved state of a dataset file. Every append or rewrite of a Parquet season changes its
+    manifest's generation or next segment; any other file is identified by its size and modification time.
+    """
+    path = storage_utils.saved_path(directory, filename)
+    if path.name == 'manifest.json':
+        manifest = storage_utils.read_manifest(path)
+        return {'file': path.name, 'generation': manifest['generation'], 'next_segment': manifest['next_segment']}
+    stat = path.stat()
+    return {'file': path.name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def write_event_file(store, path, source):
+    """
+    Write a store to an uncompressed Arrow file, which can be memory-mapped without decoding anything. The game offsets
+    and the version of the dataset it was built from go in the schema metadata. The file is written under a name of
+    its own and then renamed, so another process never maps half a file, and processes that still map the old file
+    keep reading it.
+    """
+    games = list(store.offsets)
+    info = {
+        'dataset': store.dataset,
+        'source': source,
+        'games': games,
+        'starts': [store.offsets[gid][0] for gid in games],
+        'ends': [store.offsets[gid][1] for gid in games],
+    }
+    metadata = dict(store.table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(info).encode()
+    table = store.table.replace_schema_metadata(metadata)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    with pa.OSFile(str(partial), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, path)
+
+
+def map_event_file(path):
+    """
+    Memory-map an event file
+    Parameters
+    ----------
+    path : Path
+
+    Returns
+    -------
+    The store and the version of the dataset it was built from, or (None, None) if the file isn't an event file
+    """
+    table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+    metadata = table.schema.metadata or {}
+    if METADATA_KEY not in metadata:
+        return None, None
+    info = json.loads(metadata[METADATA_KEY])
+    offsets = {gid: (start, end) for gid, start, end in zip(info['games'], info['starts'], info['ends'])}
+    return EventStore(table, offsets, info['dataset']), info['source']
+
+
+def open_store(directory, filename):
+    """
+    Open the event store of a saved dataset file. The event file is memory-mapped if it was built from the dataset as
+    it is saved now, and is rebuilt from the dataset otherwise (e.g. after games were appended).
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The EventStore
+    """
+    if not storage_utils.exists(directory, filename):
+        raise FileNotFoundError(f"{filename} has not been saved in {directory}")
+    path = event_path(directory, filename)
+    source = source_version(directory, filename)
+    if path.is_file():
+        store, built_from = map_event_file(path)
+        if store is not None and built_from == source:
+            return store
+
+    dataset = storage_utils.split_filename(filename)[0]
+    store = EventStore.from_frame(storage_utils.read(directory, filename), dataset)
+    write_event_file(store, path, source)
+    return map_event_file(path)[0]
@@ -0,0 +1,375 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cache_utils
+
+# Headers for stats.nba.com API requests
+STATS_HEADERS = {
+    'Connection': 'keep-alive',
+    'Accept': 'application/json, text/plain, */*',
+    'x-nba-stats-token': 'true',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/79.0.3945.130 Safari/537.36',
+    'x-nba-stats-origin': 'stats',
+    'Sec-Fetch-Site': 'same-origin',
+    'Sec-Fetch-Mode': 'cors',
+    'Referer': 'https://stats.nba.com/',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+# stats.nba.com team ids of the 30 teams
+TEAM_IDS = ['1610612737', '1610612738', '1610612751', '1610612766', '1610612741', '1610612739', '1610612742',
+            '1610612743', '1610612765', '1610612744', '1610612745', '1610612754', '1610612746', '1610612747',
+            '1610612763', '1610612748', '1610612749', '1610612750', '1610612740', '1610612752', '1610612760',
+            '1610612753', '1610612755', '1610612756', '1610612757', '1610612758', '1610612759', '1610612761',
+            '1610612762', '1610612764']
+
+# Responses worth retrying: rate limited or a temporary server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Most connections kept open to a single host. Extra requests to that host wait for a free connection.
+MAX_CONNECTIONS_PER_HOST = 8
+
+# Starting and maximum requests/second for the hosts we scrape. The adaptive controller moves between
+# MIN_RATE and the maximum depending on how the host is responding. Other hosts are not paced.
+HOST_RATES = {
+    'stats.nba.com': (0.5, 5.0),
+    'www.nba.com': (0.5, 2.0),
+    'www.espn.com': (0.5, 2.0),
+    'site.api.espn.com': (1.0, 5.0),
+    # basketball-reference blocks anyone going over 20 requests a minute
+    'www.basketball-reference.com': (0.25, 1 / 3),
+}
+MIN_RATE = 0.05
+
+
+def season_string(year):
+    """
+    Get the stats.nba.com season string for a season
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+
+    Returns
+    -------
+    The season string, e.g. 2023-24
+    """
+    return f"{year}-{str(year + 1)[2:]}"
+
+
+_session = None
+_session_lock = threading.Lock()
+_controllers = {}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiter. Every request takes one token, and tokens refill at a fixed rate, so any
+    number of worker threads sharing the same bucket stay under the allowed requests/second.
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second (the allowed requests/second)
+    capacity : int
+        Largest burst of requests allowed after an idle period
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = float(rate)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket whose rate adapts to the server (additive increase, multiplicative decrease). Every healthy response
+    nudges the rate up by a fixed step, and every timeout, 429, server error or empty payload cuts it by a factor, so
+    requests go as fast as the server allows instead of always paying the worst-case delay.
+    Parameters
+    ----------
+    rate : float
+        Starting requests/second
+    max_rate : float
+        The rate never goes above this
+    min_rate : float
+        The rate never goes below this
+    increase : float
+        Requests/second added after each healthy response
+    decrease : float
+        Factor the rate is multiplied by after each failure
+    """
+
+    def __init__(self, rate, max_rate, min_rate=MIN_RATE, increase=0.05, decrease=0.5):
+        super().__init__(rate)
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+
+    def success(self):
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+def get_rate_controller(url):
+    """
+    Get the shared adaptive rate controller for the host of a URL
+    Parameters
+    ----------
+    url : String
+        A URL (or bare host name)
+
+    Returns
+    -------
+    The AdaptiveRateLimiter for that host, or None if the host is not paced
+    """
+    host = urlparse(url).netloc or url
+    if host not in HOST_RATES:
+        return None
+    with _session_lock:
+        if host not in _controllers:
+            rate, max_rate = HOST_RATES[host]
+            _controllers[host] = AdaptiveRateLimiter(rate, max_rate)
+    return _controllers[host]
+
+
+def current_rate(url):
+    """
+    Get the rate (requests/second) currently used for the host of a URL
+    Parameters
+    ----------
+    url : String
+
+    Returns
+    -------
+    The rate, or None if the host is not paced
+    """
+    controller = get_rate_controller(url)
+    return None if controller is None else controller.rate
+
+
+def fetch_concurrently(items, fetch, limiter=None, workers=4):
+    """
+    Run fetch(item) for every item on a bounded pool of worker threads. Each call first takes a token from the
+    shared limiter, so the pool never goes above the allowed request rate no matter how many workers there are.
+    Parameters
+    ----------
+    items : iterable
+        The items (game ids, URLs, ...) to fetch
+    fetch : callable
+        Function called with a single item
+    limiter : TokenBucket
+        Shared rate limiter. If None, requests are only bounded by the number of workers
+    workers : int
+        Maximum number of requests in flight at once
+
+    Returns
+    -------
+    A generator of (item, result, error) tuples in completion order. error is None when the fetch succeeded.
+    """
+
+    def task(item):
+        if limiter is not None:
+            limiter.acquire()
+        return fetch(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(task, item): item for item in items}
+        for future in as_completed(futures):
+            result, error = None, None
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+            yield futures[future], result, error
+    finally:
+        # If the caller stops early (e.g. too many errors), drop everything that has not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_session():
+    """
+    Get the shared requests session. Connections are pooled per host and kept alive, so the TLS handshake with
+    stats.nba.com (or any other host) is paid once per run instead of once per request.
+    Returns
+    -------
+    The requests.Session object
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=MAX_CONNECTIONS_PER_HOST, pool_block=True)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
+
+
+def headers_for(url):
+    """
+    Get the default headers for a URL. stats.nba.com refuses requests that don't look like they come from its own
+    site, so it gets the browser-like stats headers.
+    Parameters
+    ----------
+    url : String
+
+    Returns
+    -------
+    A dictionary of headers, or None
+    """
+    if urlparse(url).netloc.endswith('stats.nba.com'):
+        return STATS_HEADERS
+    return None
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """
+    Exponential backoff with full jitter, so that workers that failed together don't all retry together
+    Parameters
+    ----------
+    attempt : int
+        How many attempts have already failed (starting at 0)
+
+    Returns
+    -------
+    The number of seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def get(url, headers=None, params=None, timeout=10, retries=5, stream=False):
+    """
+    GET a URL through the shared session. Requests are paced by the host's adaptive rate controller, and timeouts,
+    dropped connections, 429s, 5xx responses and empty payloads are retried with exponential backoff.
+    Parameters
+    ----------
+    url : String
+    headers : dict
+        Request headers. Defaults to headers_for(url)
+    params : dict or list of tuples
+        Query parameters
+    timeout : float
+        Seconds to wait for the server
+    retries : int
+        How many times to retry before giving up
+
+    Returns
+    -------
+    The requests.Response object. If every attempt timed out, the last exception is raised. If every attempt got a
+    retryable status, the last response is returned as-is.
+    """
+    if headers is None:
+        headers = headers_for(url)
+    session = get_session()
+    controller = get_rate_controller(url)
+
+    for attempt in range(retries + 1):
+        if controller is not None:
+            controller.acquire()
+        try:
+            r = session.get(url, headers=headers, params=params, timeout=timeout, stream=stream)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            if controller is not None:
+                controller.failure()
+            if attempt == retries:
+                raise
+        else:
+            # stats.nba.com sometimes throttles by answering with an empty body. A 304 is empty by design.
+            healthy = r.status_code not in RETRY_STATUSES and (stream or r.status_code == 304 or len(r.content) > 0)
+            if controller is not None:
+                if healthy:
+                    controller.success()
+                else:
+                    controller.failure()
+            if healthy or attempt == retries:
+                return r
+            r.close()
+            # Respect the server if it tells us how long to back off
+            retry_after = r.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                time.sleep(int(retry_after))
+                continue
+        time.sleep(backoff_delay(attempt))
+
+
+def get_cached(url, parse=None):
+    """
+    GET a URL through the shared response cache. The server is only asked if the response isn't cached (or has
+    expired), and a response is only cached once it parses, so a bad one is asked for again next time.
+    Parameters
+    ----------
+    url : String
+    parse : callable
+        Turns the body into the result, e.g. a resultSet decoder. None returns the body as bytes
+
+    Returns
+    -------
+    The parsed response
+    """
+    cache = cache_utils.get_cache()
+    content = cache.get(url)
+    from_cache = content is not None
+    if not from_cache:
+        r = get(url)
+        r.raise_for_status()
+        content = r.content
+    result = content if parse is None else parse(content)
+    if not from_cache:
+        cache.put(url, content)
+    return result
+
+
+def download(url, filename):
+    """
+    Save the body of a URL to a file
+    Parameters
+    ----------
+    url : String
+    filename : String or Path
+
+    Returns
+    -------
+    The filename
+    """
+    r = get(url)
+    r.raise_for_status()
+    with open(filename, 'wb') as f:
+        f.write(r.content)
+    return filename
@@ -1,13 +1,12 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import pandas as pd
-import requests
 import numpy as np
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import video_utils
+import play_index
+from fetch_utils import fetch_concurrently
 
 pd.set_option('display.max_colwidth', None)
 pd.options.mode.chained_assignment = None
@@ -37,53 +36,35 @@ def read_data(pbp_path):
     return df
 
 # Get the video links for your plays of interest and return a dataframe with them as a column.
+# For repeated queries over whole seasons, use play_index.get_play_index instead of reading the CSV every time.
 def get_links(df, player_ids_path, output_path, game_start=None, game_end=None, player_name=None, shot_types=None):
     # reduce games to certain window
-    if game_start is not None and game_end is not None:
-        df = df.loc[(df['int_gid'] >= 22300115) & (df['int_gid'] <= 22300127)]
+    if game_start is not None:
+        df = df.loc[df['int_gid'] >= int(game_start)]
+    if game_end is not None:
+        df = df.loc[df['int_gid'] <= int(game_end)]
 
     # Convert WCTIMESTRING to sortable time values to sort from earliest to latest plays.
-    df['time'] = df['WCTIMESTRING'].apply(lambda x: int(x.split(':')[0]) * 60 + int(x.split(':')[1].split()[0]) + (12 * 60 if x.split()[1] == 'AM' else 0))
-
-    # Read in your player names/IDs dataframe
-    player_names = pd.read_csv(player_ids_path)
+    clock = df['WCTIMESTRING'].str.extract(r'(\d+):(\d+)\s*(AM|PM)')
+    df['time'] = clock[0].astype(int) * 60 + clock[1].astype(int) + np.where(clock[2] == 'AM', 12 * 60, 0)
 
     # If a player is specified, only get the games that that player is in
     if player_name is not None:
-        player_id = player_names.loc[player_names['bbref_name'] == player_name.lower()]
-        player_id = player_id['nba_id'].iloc[0]
-
-        df = df.loc[df['PLAYER1_ID'] == player_id]
-
-    # Fixes some issues with GAMEID not retaining leading zeros
-    for x in range(0, len(df)):
-        if not df['GAME_ID'].iloc[x].startswith("0"):
-            df['GAME_ID'].iloc[x] = "00" + df['GAME_ID'].iloc[x]
+        df = df.loc[df['PLAYER1_ID'] == play_index.player_id_from_name(player_ids_path, player_name)]
 
     # Pick only the shots that you wanted
-    df_small = df.loc[df['EVENTMSGACTIONTYPE'].isin(shot_types)]
+    df_small = df.loc[df['EVENTMSGACTIONTYPE'].isin(shot_types)] if shot_types is not None else df
 
     # If there weren't any shots of the specified type, raise an error
     if len(df_small) == 0:
         raise Exception("No shots of specified type found!")
 
     # Sort events from first to last, chronologically
-    df_small = df_small.sort_values(by=['time'])
-
-    # Create an empty video_link column, and unify the descriptions into one
-    df_small['video_link'] = np.nan
-    df_small['description'] = (df_small['HOMEDESCRIPTION'].fillna('') +
-                               df_small['VISITORDESCRIPTION'].fillna('') +
-                               df_small['NEUTRALDESCRIPTION'].fillna(''))
-
-    # Iterate through your dataframe and create the links to scrape
-    for x in range(0, len(df_small)):
-        df_small['video_link'].iloc[
-            x] = f"https://www.nba.com/stats/events?CFID=&CFPARAMS=&GameEventID={df_small['EVENTNUM'].iloc[x]}&GameID={df_small['GAME_ID'].iloc[x]}&Season={year}-{(year % 1000) + 1}&flag=1&title={df_small['description'].iloc[x]}"
+    df_small = df_small.sort_values(by=['int_gid', 'time'])
 
-    # Replace certain characters with their URL encoding to construct a proper link
-    df_small['video_link'] = df_small['video_link'].str.replace(' ', '%20')
-    df_small['video_link'] = df_small['video_link'].str.replace("'", '%27')
+    # Create the links to scrape. This also restores the leading zeros of GAMEID.
+    df_small = play_index.add_video_links(df_small)
+    df_small = df_small.rename(columns={'DESCRIPTION': 'description'})
 
     # Write your subset of plays to CSV and return
     df_small.to_csv(output_path, index=False)
@@ -91,60 +72,77 @@ def get_links(df, player_ids_path, output_path, game_start=None, game_end=None,
 
 # This function scrapes videos from all of the constructed links and saves them to files
 def video_writer(df):
-    # Not all plays have videos. The NBA uses a default video if the real video is missing.
-    DEAD_LINK = 'https://videos.nba.com/nba/static/missing.mp4'
-
-    # Depending on your current version of Chrome, the regular install may not work.
-    # In this case, specify a previous version of the driver to install
-    # driver = webdriver.Chrome(ChromeDriverManager().install())
-    driver = webdriver.Chrome(ChromeDriverManager(driver_version='119.0.6045.104').install())
-
-    file_list = []
-
-    # Loop through the dataframe
-    for x in range(0, len(df)):
-        link = df['video_link'].iloc[x]
-             
-        # Route the driver to the video link, and wait until the video loads
-        driver.get(link)
-        wait = WebDriverWait(driver, 10)  # Maximum wait time of 10 seconds
-        # Get the source MP4 file in the webpage
-        video = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'video.vjs-tech')))
-        video_src = video.get_attribute('src')
-
-        # As long as the video exists, write it to a local MP4 file
-        if video_src != DEAD_LINK and video_src != '':
-            highlight = requests.get(video_src)
-            # Save all the videos to their own MP4 files
-            filename = video_src.split('/')[-1]
-            with open(filename, 'wb') as file:
-                file_list.append(filename)
-                file.write(highlight.content)
-
-    # Close the WebDriver
-    driver.quit()
+    # Resolve every play to its mp4 first. Plays resolved for an earlier reel come straight from the URL cache.
+    video_srcs = video_utils.resolve_video_urls(df)
+    keys = list(zip(df['GAME_ID'], df['EVENTNUM']))
+
+    video_srcs = [video_srcs.get(key) for key in keys]
+    # As long as the video exists, download it into the clip store
+    video_srcs = [src for src in video_srcs if src is not None and src != video_utils.DEAD_LINK and src != '']
+    clips = video_utils.download_clips(video_srcs)
+
+    # Keep the order of the dataframe so the plays stay in chronological order
+    file_list = [str(clips[src]) for src in video_srcs if src in clips]
 
     # Write all of your MP4 file names to a .txt file so they can be stitched together with FFMPEG
     with open("filelist.txt", "w") as filelist:
         for video_file in file_list:
             filelist.write(f"file '{video_file}'\n")
 
+    return file_list
+
 # This function stitches all of the videos together into a single file called 'merged_video.mp4'
 def video_stitcher():
-    # Bash command to stitch the videos together
-    command = 'ffmpeg -f concat -safe 0 -i filelist.txt -c copy merged_video.mp4'
+    # ffmpeg command to stitch the videos together
+    command = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', 'filelist.txt', '-c', 'copy', 'merged_video.mp4']
 
     # Run the command
     try:
-        subprocess.run(command, shell=True, check=True)
+        subprocess.run(command, check=True)
     except subprocess.CalledProcessError as e:
         print(f"Error: {e}")
     else:
         print("Command executed successfully")
 
+# This function builds the whole reel as a pipeline: every clip is normalized as soon as its download finishes, while
+# the other clips are still downloading, and the final stitch only copies the ready segments together.
+# Returns the list of clips used in the reel.
+def build_reel(df, output='merged_video.mp4', workers=4):
+    # Resolve every play to its mp4 first. Plays resolved for an earlier reel come straight from the URL cache.
+    video_srcs = video_utils.resolve_video_urls(df)
+    video_srcs = [video_srcs.get(key) for key in zip(df['GAME_ID'], df['EVENTNUM'])]
+    # As long as the video exists, put it in the reel
+    video_srcs = [src for src in video_srcs if src is not None and src != video_utils.DEAD_LINK and src != '']
+    unique_srcs = list(dict.fromkeys(video_srcs))
+
+    clips = {}
+    segments = {}
+    with ThreadPoolExecutor(max_workers=workers) as normalizer:
+        pending = {}
+        for src, clip, error in fetch_concurrently(unique_srcs, video_utils.download_clip, workers=workers):
+            if error is not None:
+                print(f"Download failed for {src}: {error!r}")
+                continue
+            clips[src] = clip
+            pending[normalizer.submit(video_utils.normalize_clip, clip)] = src
+        for future in as_completed(pending):
+            try:
+                segments[pending[future]] = future.result()
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"Could not process {pending[future]}: {e!r}")
+
+    # Keep the order of the dataframe so the plays stay in chronological order
+    ordered = [segments[src] for src in video_srcs if src in segments]
+    if not ordered:
+        raise Exception("No clips to stitch!")
+    video_utils.concat_segments(ordered, output)
+    print(f"Reel written to {output}")
+    return [str(clips[src]) for src in video_srcs if src in segments]
+
 # This function deletes the component videos
 def video_cleanup(file_list):
-    # Loop through the file names in your text file and delete them
+    clip_dir = video_utils.get_clip_store().directory
+    # Loop through the file names in your text file and delete them. Clips in the clip store are kept for other reels.
     for video in file_list:
-        if video.endswith('.mp4') and not video.endswith("merged_video.mp4"):
+        if video.endswith('.mp4') and not video.endswith("merged_video.mp4") and clip_dir not in Path(video).parents:
             os.remove(video)
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The play-by-play is read through the storage layer at the top of the repository
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import storage_utils
+
+# Columns kept from the play-by-play for every shot
+PBP_COLUMNS = ['GAME_ID', 'EVENTNUM', 'EVENTMSGTYPE', 'EVENTMSGACTIONTYPE', 'PLAYER1_ID', 'PLAYER1_TEAM_ID',
+               'HOMEDESCRIPTION', 'NEUTRALDESCRIPTION', 'VISITORDESCRIPTION']
+
+# Made and missed field goals
+SHOT_EVENTS = [1, 2]
+
+# The columns a play can be looked up by, and the name of each one in a query
+KEYS = {'player_id': 'PLAYER1_ID', 'action_type': 'EVENTMSGACTIONTYPE', 'team_id': 'TEAM_ID',
+        'opponent_id': 'OPPONENT_ID', 'event_type': 'EVENTMSGTYPE'}
+
+
+def index_dir():
+    return Path.cwd() / "DataPack" / "Highlights" / "play_index"
+
+
+# The play-by-play and schedule written by data_utils for a season. The play-by-play path is the file that changes
+# whenever games are added to it (its manifest, or a single file for older layouts).
+def pbp_path(year):
+    return storage_utils.saved_path(Path.cwd() / "DataPack", f"reg_pbp_{year}.csv")
+
+
+def schedule_path(year):
+    return Path.cwd() / "DataPack" / f"nba_schedule_{year}.json"
+
+
+# Get a game id -> date dataframe from the season's schedule. Games missing from it get no date.
+def read_game_dates(year):
+    if not os.path.isfile(schedule_path(year)):
+        return pd.DataFrame({'GAME_ID': pd.Series(dtype='int64'), 'GAME_DATE': pd.Series(dtype='datetime64[ns]')})
+    with open(schedule_path(year), "r") as f:
+        schedule = json.load(f)
+    rows = [(int(gid), day) for day, gids in schedule.items() for gid in gids]
+    dates = pd.DataFrame(rows, columns=['GAME_ID', 'GAME_DATE']).drop_duplicates(subset=['GAME_ID'])
+    dates['GAME_DATE'] = pd.to_datetime(dates['GAME_DATE'], format="%Y-%m-%d")
+    return dates
+
+
+# Build one season's partition of the index: every shot with its shooter, team, opponent and game date
+def build_season(year):
+    pbp = storage_utils.read(Path.cwd() / "DataPack", f"reg_pbp_{year}.csv", columns=PBP_COLUMNS)
+    pbp = pbp.loc[pbp['EVENTMSGTYPE'].isin(SHOT_EVENTS)]
+
+    plays = pd.DataFrame({
+        'SEASON': np.int16(year),
+        'GAME_ID': pbp['GAME_ID'].astype('int64'),
+        'EVENTNUM': pbp['EVENTNUM'].astype('int32'),
+        'EVENTMSGTYPE': pbp['EVENTMSGTYPE'].astype('int8'),
+        'EVENTMSGACTIONTYPE': pbp['EVENTMSGACTIONTYPE'].astype('int16'),
+        'PLAYER1_ID': pbp['PLAYER1_ID'].astype('int64'),
+        'TEAM_ID': pbp['PLAYER1_TEAM_ID'].astype('int64'),
+        'DESCRIPTION': (pbp['HOMEDESCRIPTION'].fillna('') + pbp['VISITORDESCRIPTION'].fillna('') +
+                        pbp['NEUTRALDESCRIPTION'].fillna('')),
+    })
+
+    # Both teams shoot in every game, so the opponent is the other team id of the game
+    teams = plays.groupby('GAME_ID')['TEAM_ID'].agg(['min', 'max'])
+    low = plays['GAME_ID'].map(teams['min'])
+    high = plays['GAME_ID'].map(teams['max'])
+    plays['OPPONENT_ID'] = np.where(plays['TEAM_ID'] == low, high, low).astype('int64')
+
+    plays = plays.merge(read_game_dates(year), on='GAME_ID', how='left')
+    return plays.sort_values(['GAME_ID', 'EVENTNUM'], ignore_index=True)
+
+
+# Get a season's partition, rebuilding it only if the play-by-play changed since it was written
+def load_season(year):
+    path = index_dir() / f"{year}.parquet"
+    source = pbp_path(year)
+    if path.is_file() and (not source.is_file() or os.path.getmtime(path) >= os.path.getmtime(source)):
+        return pd.read_parquet(path)
+
+    plays = build_season(year)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.partial')
+    plays.to_parquet(partial, index=False)
+    os.replace(partial, path)
+    return plays
+
+
+class PlayIndex:
+    # Inverted index over the shots of several seasons. For each key (player, shot type, team, opponent, made/missed)
+    # it holds the sorted row numbers of the plays with each value, so a query intersects a few short arrays instead
+    # of scanning every shot. Rows are in (date, game, event) order, so a date range is a binary search. Plays of games
+    # missing from the schedule have no date; they go last, where numpy's searchsorted expects NaT, and are left out
+    # of any query with a date range.
+    def __init__(self, plays):
+        plays = plays.sort_values(['GAME_DATE', 'GAME_ID', 'EVENTNUM'], ignore_index=True, na_position='last')
+        self.plays = plays
+        self.dates = plays['GAME_DATE'].to_numpy()
+        self.dated = int(plays['GAME_DATE'].notna().sum())
+        self.postings = {column: {value: np.sort(rows) for value, rows in plays.groupby(column).indices.items()}
+                         for column in KEYS.values()}
+
+    def rows(self, start=None, end=None, **keys):
+        dates = self.dates if start is None and end is None else self.dates[:self.dated]
+        first = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), 'left')
+        last = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), 'right')
+        # The posting lists of every key that was given, one list per value asked for
+        lists = []
+        for name, values in keys.items():
+            if values is None:
+                continue
+            postings = self.postings[KEYS[name]]
+            values = values if isinstance(values, (list, tuple, set, np.ndarray)) else [values]
+            lists.append([postings[value] for value in values if value in postings])
+        if not lists:
+            return np.arange(first, last)
+
+        # Start from the most selective key and only look the candidates up in the longer lists, so a query costs
+        # about (matches x keys x log(plays)) no matter how many plays are indexed
+        lists.sort(key=lambda arrays: sum(len(rows) for rows in arrays))
+        result = np.unique(np.concatenate(lists[0])) if lists[0] else np.empty(0, dtype=np.intp)
+        result = result[(result >= first) & (result < last)]
+        for arrays in lists[1:]:
+            keep = np.zeros(len(result), dtype=bool)
+            for rows in arrays:
+                positions = np.minimum(np.searchsorted(rows, result), len(rows) - 1)
+                keep |= rows[positions] == result
+            result = result[keep]
+        return result
+
+    # Get the plays that match every given key, in chronological order. start and end are dates (inclusive).
+    # e.g. index.query(player_id=1629029, action_type=[80, 104], start='2023-10-24', end='2024-04-14')
+    def query(self, player_id=None, action_type=None, team_id=None, opponent_id=None, event_type=1, start=None,
+              end=None):
+        rows = self.rows(start=start, end=end, player_id=player_id, action_type=action_type, team_id=team_id,
+                         opponent_id=opponent_id, event_type=event_type)
+        return self.plays.iloc[rows]
+
+    # Get just the (GAME_ID, EVENTNUM) ids of the matching plays
+    def event_ids(self, **query):
+        plays = self.query(**query)
+        return list(zip(plays['GAME_ID'], plays['EVENTNUM']))
+
+
+# Load the index for several seasons, building any season partition that is missing or out of date
+def get_play_index(years):
+    return PlayIndex(pd.concat([load_season(year) for year in years], ignore_index=True))
+
+
+# Add the nba.com video page of every play as a video_link column, and the 10 character GAME_ID the video pages use
+def add_video_links(df):
+    df = df.copy()
+    game_ids = df['GAME_ID'].astype('int64').astype(str).str.zfill(10)
+    # The 4th and 5th characters of the game id are the year the season starts in, e.g. 0022300115 is 2023-24
+    years = game_ids.str[3:5].astype(int) + 2000
+    seasons = years.astype(str) + '-' + (years + 1).astype(str).str[2:]
+    if 'DESCRIPTION' not in df.columns:
+        df['DESCRIPTION'] = (df['HOMEDESCRIPTION'].fillna('') + df['VISITORDESCRIPTION'].fillna('') +
+                             df['NEUTRALDESCRIPTION'].fillna(''))
+    # Replace certain characters with their URL encoding to construct a proper link
+    titles = df['DESCRIPTION'].str.replace(' ', '%20').str.replace("'", '%27')
+
+    df['GAME_ID'] = game_ids
+    df['video_link'] = ("https://www.nba.com/stats/events?CFID=&CFPARAMS=&GameEventID=" + df['EVENTNUM'].astype(str) +
+                        "&GameID=" + game_ids + "&Season=" + seasons + "&flag=1&title=" + titles)
+    return df
+
+
+# Get a player's nba id from the player names/IDs dataframe written by data_utils
+def player_id_from_name(player_ids_path, player_name):
+    player_names = pd.read_csv(player_ids_path)
+    player_id = player_names.loc[player_names['bbref_name'] == player_name.lower(), 'nba_id']
+    if len(player_id) == 0:
+        raise Exception(f"No player named {player_name} found!")
+    return int(player_id.iloc[0])
+
+
+if __name__ == '__main__':
+    import time
+
+    # e.g. python play_index.py 2023 1629029 80 104
+    index = get_play_index([int(sys.argv[1])])
+    start_time = time.perf_counter()
+    found = index.event_ids(player_id=int(sys.argv[2]), action_type=[int(x) for x in sys.argv[3:]] or None)
+    print(f"{len(found)} plays in {(time.perf_counter() - start_time) * 1000:.2f} ms")
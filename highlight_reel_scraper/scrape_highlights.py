@@ -1,4 +1,4 @@
-from highlight_scraper_utils.py import *
+from highlight_scraper_utils import *
 
 # Helpful dictionary of shot types
 SHOTS = {1: 'Normal Jumper', 2: 'Running Jumper', 3: 'Hook Shot', 5: 'Normal Layup',
@@ -16,15 +16,15 @@ SHOTS = {1: 'Normal Jumper', 2: 'Running Jumper', 3: 'Hook Shot', 5: 'Normal Lay
          108: 'Cutting Dunk', 109: 'Driving Reverse Dunk', 110: 'Running Reverse Dunk'
          }
 
-# Insert your PBP data path here
-pbp_path = ""
+# The seasons to search. The index of every season is built from DataPack/reg_pbp_{year}.csv the first time, and
+# reused after that until the play-by-play changes
+seasons = [2023]
+index = play_index.get_play_index(seasons)
 
-# Read the dataframe from your specified year
-df = read_data(pbp_path)
-
-game_start=22300115
-game_end=22300127
-player_name='Luka Doncic'
+# Dates (inclusive) to search between. None searches the whole seasons
+start_date = '2023-11-01'
+end_date = '2023-11-15'
+player_name = 'Luka Doncic'
 
 # HELPFUL SHOT TYPES: [80, 104] - stepback, [43, 52, 100, 106] - alley-oop
 shot_types = [80, 104]
@@ -33,14 +33,18 @@ shot_types = [80, 104]
 player_ids_path = ""
 output_path = ""
 
-# Get the video links for your desired plays
-df = get_links(df, output_path, player_ids_path, game_start=game_start, game_end=game_end, player_name=player_name, shot_types=shot_types)
-
-# Write the video for each play to a file. Save the names of these files so they can be deleted later
-files = video_writer(df)
+# Get the video links for your desired plays. You can also narrow down by team_id and opponent_id.
+# To work from a single play-by-play CSV instead, use read_data and get_links.
+player_id = play_index.player_id_from_name(player_ids_path, player_name) if player_name is not None else None
+df = index.query(player_id=player_id, action_type=shot_types, start=start_date, end=end_date)
+if len(df) == 0:
+    raise Exception("No shots of specified type found!")
+df = play_index.add_video_links(df)
+df.to_csv(output_path, index=False)
 
-# Stitch the videos together using FFMPEG. The saved file will be called 'merged_video.mp4'
-video_stitcher()
+# Download the video for each play and stitch them together with FFMPEG as the downloads come in. The saved file will
+# be called 'merged_video.mp4'. Save the names of the clips so they can be deleted later
+files = build_reel(df)
 
 # Delete the individual play videos
-video_cleanup(file_list)
+video_cleanup(files)
@@ -0,0 +1,338 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from fractions import Fraction
+import hashlib
+import json
+import os
+import subprocess
+import sqlite3
+import threading
+import time
+import sys
+from pathlib import Path
+
+# The shared scraping utilities live at the top of the repository
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import browser_utils
+import fetch_utils
+
+# Not all plays have videos. The NBA uses a default video if the real video is missing.
+DEAD_LINK = 'https://videos.nba.com/nba/static/missing.mp4'
+
+
+# Everything the highlight scraper keeps between reels lives here
+def highlights_dir():
+    directory = Path.cwd() / "DataPack" / "Highlights"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+# Persistent map of (GAME_ID, EVENTNUM) to the play's mp4, so a play is only ever resolved once across reels.
+# A play without a video is stored with the DEAD_LINK, which is an answer too.
+class VideoUrlCache:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS video_urls (game_id TEXT, eventnum INTEGER, url TEXT, "
+                        "resolved_at REAL, PRIMARY KEY (game_id, eventnum))")
+        self.db.commit()
+
+    # Get the cached URLs for a list of (game_id, eventnum) keys. Missing keys are left out.
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for game_id, eventnum in keys:
+                row = self.db.execute("SELECT url FROM video_urls WHERE game_id = ? AND eventnum = ?",
+                                      (str(game_id), int(eventnum))).fetchone()
+                if row is not None:
+                    found[(game_id, eventnum)] = row[0]
+        return found
+
+    def put(self, key, url):
+        game_id, eventnum = key
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO video_urls VALUES (?, ?, ?, ?)",
+                            (str(game_id), int(eventnum), url, time.time()))
+            self.db.commit()
+
+
+_url_cache = None
+
+
+def get_url_cache():
+    global _url_cache
+    if _url_cache is None:
+        _url_cache = VideoUrlCache(highlights_dir() / "video_urls.sqlite")
+    return _url_cache
+
+
+# The stats.nba.com endpoint behind the video page
+def video_event_url(game_id, eventnum):
+    return f"https://stats.nba.com/stats/videoeventsasset?GameEventID={eventnum}&GameID={game_id}"
+
+
+# Get the mp4 of a play straight from the events endpoint, without loading the video page.
+# Returns None if the endpoint doesn't list a video.
+def resolve_from_events(key):
+    game_id, eventnum = key
+    r = fetch_utils.get(video_event_url(game_id, eventnum))
+    r.raise_for_status()
+    video_urls = r.json()['resultSets']['Meta']['videoUrls']
+    if not video_urls:
+        return None
+    # Prefer the large version, then medium, then small
+    video = video_urls[0]
+    return video.get('lurl') or video.get('murl') or video.get('surl')
+
+
+# Get the source MP4 file of a play from its video page
+def get_video_src(driver, link):
+    # Route the driver to the video link, and wait until the video loads
+    driver.get(link)
+    wait = WebDriverWait(driver, 10)  # Maximum wait time of 10 seconds
+    video = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'video.vjs-tech')))
+    return video.get_attribute('src')
+
+
+# Resolve every play of a dataframe (GAME_ID, EVENTNUM and video_link columns) to its mp4 URL.
+# Cached plays are answered from the URL cache, the rest are asked to the events endpoint concurrently, and only
+# the ones it can't answer go through the headless browser pool. Returns a dict of (GAME_ID, EVENTNUM) -> URL.
+def resolve_video_urls(df, workers=4):
+    cache = get_url_cache()
+    links = {(game_id, eventnum): link
+             for game_id, eventnum, link in zip(df['GAME_ID'], df['EVENTNUM'], df['video_link'])}
+
+    resolved = cache.get_many(links)
+    pending = [key for key in links if key not in resolved]
+
+    browser_keys = []
+    for key, url, error in fetch_utils.fetch_concurrently(pending, resolve_from_events, workers=workers):
+        if error is not None or not url:
+            browser_keys.append(key)
+            continue
+        resolved[key] = url
+        cache.put(key, url)
+
+    if browser_keys:
+        # The video pages are loaded in parallel across the shared pool of headless drivers
+        pool = browser_utils.get_driver_pool()
+        for key, url, error in pool.map(lambda driver, key: get_video_src(driver, links[key]), browser_keys):
+            if error is not None or not url:
+                print(f"No video found for {links[key]}: {error!r}")
+                continue
+            resolved[key] = url
+            cache.put(key, url)
+
+    return resolved
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+# Content-addressed store of downloaded clips, shared by every reel. A clip lives at clips/<sha256[:2]>/<sha256>.mp4,
+# and a small index maps each video URL to the hash and size of its clip.
+class ClipStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.partial_dir = self.directory / "partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS clips (url TEXT PRIMARY KEY, sha256 TEXT, size INTEGER, "
+                        "stored_at REAL)")
+        self.db.commit()
+
+    def clip_path(self, sha256):
+        return self.directory / sha256[:2] / f"{sha256}.mp4"
+
+    # Where an unfinished download of a URL is kept, so it can be resumed
+    def partial_path(self, url):
+        return self.partial_dir / f"{hashlib.sha1(url.encode()).hexdigest()}.part"
+
+    # Get the stored clip of a URL, or None if it hasn't been downloaded (or the file is gone or the wrong size)
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT sha256, size FROM clips WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = self.clip_path(row[0])
+        if not path.is_file() or path.stat().st_size != row[1]:
+            return None
+        return path
+
+    # Check a stored clip against its hash, not just its size
+    def verify(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT sha256 FROM clips WHERE url = ?", (url,)).fetchone()
+        path = self.lookup(url)
+        return path is not None and file_sha256(path) == row[0]
+
+    # Move a finished download into the store
+    def add(self, url, partial, sha256):
+        path = self.clip_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = partial.stat().st_size
+        if path.is_file():
+            # The same clip was already stored under another URL
+            partial.unlink()
+        else:
+            os.replace(partial, path)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?)", (url, sha256, size, time.time()))
+            self.db.commit()
+        return path
+
+
+_clip_store = None
+
+
+def get_clip_store():
+    global _clip_store
+    if _clip_store is None:
+        _clip_store = ClipStore(highlights_dir() / "clips")
+    return _clip_store
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# Stream one clip into the store in chunks, so memory use doesn't depend on the clip size. A partial file left by an
+# interrupted run is resumed with a Range request. Returns the path of the stored clip.
+def download_clip(url):
+    store = get_clip_store()
+    path = store.lookup(url)
+    if path is not None:
+        return path
+
+    partial = store.partial_path(url)
+    offset = partial.stat().st_size if partial.is_file() else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else None
+
+    r = fetch_utils.get(url, headers=headers, stream=True, timeout=30)
+    with r:
+        if r.status_code == 416:
+            # The partial file is already complete (or bigger than the clip). Start over to be safe.
+            partial.unlink()
+            return download_clip(url)
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            # Content-Range: bytes <start>-<end>/<total>
+            expected = int(r.headers['Content-Range'].split('/')[-1])
+            mode = 'ab'
+        else:
+            # The server ignored the Range header, so we get the whole clip again
+            expected = int(r.headers['Content-Length']) if 'Content-Length' in r.headers else None
+            mode = 'wb'
+
+        with open(partial, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+    size = partial.stat().st_size
+    if expected is not None and size != expected:
+        raise IOError(f"Incomplete download of {url}: {size} of {expected} bytes. Run again to resume.")
+    return store.add(url, partial, file_sha256(partial))
+
+
+# Download every clip into the clip store, N at a time. Returns a dict of URL -> stored clip path; clips that failed
+# are left out (and resume from where they stopped on the next run).
+def download_clips(urls, workers=4):
+    paths = {}
+    for url, path, error in fetch_utils.fetch_concurrently(list(dict.fromkeys(urls)), download_clip, workers=workers):
+        if error is not None:
+            print(f"Download failed for {url}: {error!r}")
+            continue
+        paths[url] = path
+    return paths
+
+
+# Every clip is brought to this format before stitching, so the final concat can copy the streams as-is
+TARGET_WIDTH = 1280
+TARGET_HEIGHT = 720
+TARGET_FPS = 30
+TARGET_PIX_FMT = 'yuv420p'
+TARGET_SAMPLE_RATE = 48000
+TARGET_CHANNELS = 2
+NORMALIZE_PROFILE = (f"h264_{TARGET_PIX_FMT}_{TARGET_WIDTH}x{TARGET_HEIGHT}_{TARGET_FPS}fps_"
+                     f"aac_{TARGET_SAMPLE_RATE}hz_{TARGET_CHANNELS}ch")
+# What probe_clip returns for a clip that is already in the target format
+TARGET_STREAMS = {'video_codec': 'h264', 'width': TARGET_WIDTH, 'height': TARGET_HEIGHT, 'fps': Fraction(TARGET_FPS),
+                  'pix_fmt': TARGET_PIX_FMT, 'audio_codec': 'aac', 'sample_rate': TARGET_SAMPLE_RATE,
+                  'channels': TARGET_CHANNELS}
+
+
+# Run ffmpeg/ffprobe without going through a shell
+def run_command(args):
+    return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+
+
+# Get the codecs, size, frame rate and pixel format of a clip, and the sample rate and channels of its audio.
+# The audio fields are None for a clip without audio.
+def probe_clip(path):
+    output = run_command(['ffprobe', '-v', 'error', '-show_entries',
+                          'stream=codec_type,codec_name,width,height,r_frame_rate,pix_fmt,sample_rate,channels',
+                          '-of', 'json', str(path)])
+    streams = json.loads(output).get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+    # ffprobe gives the frame rate as a fraction (e.g. 30000/1001) and the sample rate as a string
+    frame_rate = video.get('r_frame_rate')
+    fps = Fraction(frame_rate) if frame_rate and not frame_rate.endswith('/0') else None
+    sample_rate = int(audio['sample_rate']) if audio.get('sample_rate') else None
+    return {'video_codec': video.get('codec_name'), 'width': video.get('width'), 'height': video.get('height'),
+            'fps': fps, 'pix_fmt': video.get('pix_fmt'), 'audio_codec': audio.get('codec_name'),
+            'sample_rate': sample_rate, 'channels': audio.get('channels')}
+
+
+# Turn a stored clip into an MPEG-TS segment in the target format. Clips that already match it in every stream
+# parameter are only remuxed, the rest are re-encoded. A clip without audio gets a silent track, so every segment has
+# the same streams. Segments are cached next to the clip store by clip hash and format, so a play used in another
+# reel is never processed twice.
+def normalize_clip(path):
+    path = Path(path)
+    segment_dir = highlights_dir() / "segments"
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    segment = segment_dir / f"{path.stem}_{NORMALIZE_PROFILE}.ts"
+    if segment.is_file():
+        return segment
+
+    info = probe_clip(path)
+    partial = segment.with_suffix('.partial.ts')
+    if info == TARGET_STREAMS:
+        args = ['ffmpeg', '-y', '-v', 'error', '-i', str(path), '-map', '0:v:0', '-map', '0:a:0', '-c', 'copy',
+                '-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts', str(partial)]
+    else:
+        args = ['ffmpeg', '-y', '-v', 'error', '-i', str(path)]
+        if info['audio_codec'] is None:
+            # Silence as long as the video, in place of the missing audio track
+            args += ['-f', 'lavfi', '-i', f"anullsrc=channel_layout=stereo:sample_rate={TARGET_SAMPLE_RATE}",
+                     '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+        else:
+            args += ['-map', '0:v:0', '-map', '0:a:0']
+        scale = (f"scale={TARGET_WIDTH}:{TARGET_HEIGHT}:force_original_aspect_ratio=decrease,"
+                 f"pad={TARGET_WIDTH}:{TARGET_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+        args += ['-vf', scale, '-r', str(TARGET_FPS), '-pix_fmt', TARGET_PIX_FMT, '-c:v', 'libx264',
+                 '-preset', 'veryfast', '-crf', '20', '-c:a', 'aac', '-ar', str(TARGET_SAMPLE_RATE),
+                 '-ac', str(TARGET_CHANNELS), '-f', 'mpegts', str(partial)]
+    run_command(args)
+    os.replace(partial, segment)
+    return segment
+
+
+# Stitch normalized segments into one mp4. normalize_clip gives every segment the same video and audio streams in
+# the same format, so the streams are copied, which takes moments no matter how long the reel is.
+def concat_segments(segments, output):
+    list_file = Path(output).with_suffix('.txt')
+    with open(list_file, 'w') as f:
+        for segment in segments:
+            f.write(f"file '{Path(segment).resolve()}'\n")
+    run_command(['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', str(list_file), '-c', 'copy',
+                 '-bsf:a', 'aac_adtstoasc', '-movflags', '+faststart', str(output)])
+    return output
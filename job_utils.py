@@ -0,0 +1,243 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+# Games that failed too many times. They are skipped until someone looks at them and calls retry_dead_letters.
+DEAD = 'dead'
+
+MAX_ATTEMPTS = 3
+
+
+class JobQueue:
+    """
+    Persistent per-game job table for the scraping and parsing stages, keyed by (stage, game_id). Each job is pending,
+    running, done, failed (will be retried) or dead (failed MAX_ATTEMPTS times and parked in the dead-letter list), so a
+    stage can resume where it stopped without re-reading its output, and one bad game never stops the others.
+    Parameters
+    ----------
+    path : String or Path
+        The SQLite file holding the job table
+    max_attempts : int
+        How many times a game is tried before it goes to the dead-letter list
+    """
+
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS jobs (stage TEXT, game_id TEXT, state TEXT, attempts INTEGER, "
+                        "last_error TEXT, updated_at REAL, PRIMARY KEY (stage, game_id))")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (stage, state)")
+        self.db.commit()
+
+    def _set_state(self, stage, game_ids, state, error=None):
+        now = time.time()
+        with self.lock:
+            self.db.executemany("UPDATE jobs SET state = ?, last_error = ?, updated_at = ? "
+                                "WHERE stage = ? AND game_id = ?",
+                                [(state, error, now, stage, str(gid)) for gid in game_ids])
+            self.db.commit()
+
+    def count(self, stage):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM jobs WHERE stage = ?", (stage,)).fetchone()[0]
+
+    def add(self, stage, game_ids):
+        """
+        Queue games for a stage. Games that are already in the table keep their state.
+        Parameters
+        ----------
+        stage : String
+            e.g. pbp, pap or possessions
+        game_ids : list
+        """
+        now = time.time()
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO jobs (stage, game_id, state, attempts, updated_at) "
+                                "VALUES (?, ?, ?, 0, ?)", [(stage, str(gid), PENDING, now) for gid in game_ids])
+            self.db.commit()
+
+    def reset(self, stage):
+        """
+        Forget every job of a stage, e.g. because its output file was deleted
+        Parameters
+        ----------
+        stage : String
+        """
+        with self.lock:
+            self.db.execute("DELETE FROM jobs WHERE stage = ?", (stage,))
+            self.db.commit()
+
+    def pending(self, stage, upstream=None):
+        """
+        Get the games still to do for a stage. Jobs left running by a run that crashed are picked up again.
+        Parameters
+        ----------
+        stage : String
+        upstream : String
+            The stage whose output this stage reads. If given, only games that stage has finished are returned.
+
+        Returns
+        -------
+        A list of game ids, in the order they were queued
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT game_id FROM jobs AS job WHERE stage = ? AND state IN (?, ?, ?) AND "
+                                   "(? IS NULL OR EXISTS (SELECT 1 FROM jobs WHERE stage = ? AND "
+                                   "game_id = job.game_id AND state = ?)) ORDER BY rowid",
+                                   (stage, PENDING, RUNNING, FAILED, upstream, upstream, DONE)).fetchall()
+        return [row[0] for row in rows]
+
+    def done_ids(self, stage):
+        """
+        Get the games a stage has finished
+        Parameters
+        ----------
+        stage : String
+
+        Returns
+        -------
+        A list of game ids, in the order they were queued
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT game_id FROM jobs WHERE stage = ? AND state = ? ORDER BY rowid",
+                                   (stage, DONE)).fetchall()
+        return [row[0] for row in rows]
+
+    def start(self, stage, game_ids):
+        """
+        Mark games as running and count the attempt
+        """
+        now = time.time()
+        with self.lock:
+            self.db.executemany("UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? "
+                                "WHERE stage = ? AND game_id = ?",
+                                [(RUNNING, now, stage, str(gid)) for gid in game_ids])
+            self.db.commit()
+
+    def release(self, stage, game_ids):
+        """
+        Put running games back in the queue without counting the attempt, e.g. because their input isn't cached in
+        offline mode. Nothing is wrong with the game itself, so it should not get any closer to the dead-letter list.
+        """
+        now = time.time()
+        with self.lock:
+            self.db.executemany("UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), updated_at = ? "
+                                "WHERE stage = ? AND game_id = ? AND state = ?",
+                                [(PENDING, now, stage, str(gid), RUNNING) for gid in game_ids])
+            self.db.commit()
+
+    def done(self, stage, game_ids):
+        """
+        Mark games as done. Only call this once their output has been written.
+        """
+        self._set_state(stage, game_ids, DONE)
+
+    def fail(self, stage, game_id, error):
+        """
+        Record a failed attempt. After max_attempts failures the game goes to the dead-letter list.
+        Parameters
+        ----------
+        stage : String
+        game_id : String
+        error : Exception or String
+            What went wrong, kept for the dead-letter list
+        """
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, last_error = ?, "
+                            "updated_at = ? WHERE stage = ? AND game_id = ?",
+                            (self.max_attempts, DEAD, FAILED, repr(error), now, stage, str(game_id)))
+            self.db.commit()
+
+    def dead_letters(self, stage):
+        """
+        Get the games that failed too many times
+        Parameters
+        ----------
+        stage : String
+
+        Returns
+        -------
+        A list of (game_id, attempts, last_error) tuples
+        """
+        with self.lock:
+            return self.db.execute("SELECT game_id, attempts, last_error FROM jobs WHERE stage = ? AND state = ? "
+                                   "ORDER BY rowid", (stage, DEAD)).fetchall()
+
+    def retry_dead_letters(self, stage):
+        """
+        Put every dead-lettered game of a stage back in the queue with a fresh set of attempts
+        Parameters
+        ----------
+        stage : String
+        """
+        with self.lock:
+            self.db.execute("UPDATE jobs SET state = ?, attempts = 0 WHERE stage = ? AND state = ?",
+                            (PENDING, stage, DEAD))
+            self.db.commit()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(year):
+    """
+    Get the job table for a season, creating it under DataPack the first time it is used
+    Parameters
+    ----------
+    year : int
+        The season you are interested in
+
+    Returns
+    -------
+    The JobQueue object
+    """
+    with _queues_lock:
+        if year not in _queues:
+            _queues[year] = JobQueue(Path.cwd() / "DataPack" / f"jobs_{year}.sqlite")
+    return _queues[year]
+
+
+def sync_stage(queue, stage, game_ids, output_file, read_done_ids, upstream=None):
+    """
+    Bring a stage's job table in line with its output file and queue any new games. A stage that reads another
+    stage's output only gets the games that stage has finished, so a game that isn't there yet (not played, or its
+    scrape failed) is not attempted, and is queued on a later run once it is.
+    Parameters
+    ----------
+    queue : JobQueue
+    stage : String
+    game_ids : list
+        Every game the stage should cover
+    output_file : Path
+        The stage's output. If it is gone, the stage starts over. If it exists but the stage has never been tracked
+        (it was written before the job table existed), the games in it are marked done.
+    read_done_ids : callable
+        Returns the game ids found in the output file. Only called for that one-time migration.
+    upstream : String
+        The stage whose output this stage reads, e.g. pbp for pap
+
+    Returns
+    -------
+    The list of game ids still to do
+    """
+    if not output_file.is_file():
+        queue.reset(stage)
+    elif queue.count(stage) == 0:
+        done_ids = read_done_ids()
+        queue.add(stage, done_ids)
+        queue.done(stage, done_ids)
+    if upstream is not None:
+        finished = set(queue.done_ids(upstream))
+        game_ids = [gid for gid in game_ids if str(gid) in finished]
+    queue.add(stage, game_ids)
+    return queue.pending(stage, upstream)
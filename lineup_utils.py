@@ -0,0 +1,113 @@
+from urllib.parse import urlencode
+
+import pandas as pd
+
+import fetch_utils
+import schema_utils
+
+# Columns shared by every MeasureType of the leaguedashlineups endpoint. A lineup is one GROUP_ID for one team.
+LINEUP_KEY = ['SEASON', 'TEAM_ID', 'GROUP_ID']
+
+
+def lineup_url(year, team_id, measure_type='Advanced', group_quantity=5):
+    """
+    Get the leaguedashlineups endpoint for one team's lineups in a season
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    team_id : String
+    measure_type : String
+        e.g. Base, Advanced, Four Factors
+    group_quantity : int
+        Number of players in a lineup
+
+    Returns
+    -------
+    The URL
+    """
+    params = (
+        ('Conference', ''),
+        ('DateFrom', ''),
+        ('DateTo', ''),
+        ('Division', ''),
+        ('GameID', ''),
+        ('GameSegment', ''),
+        ('GroupQuantity', str(group_quantity)),
+        ('LastNGames', '0'),
+        ('LeagueID', '00'),
+        ('Location', ''),
+        ('MeasureType', measure_type),
+        ('Month', '0'),
+        ('OpponentTeamID', '0'),
+        ('Outcome', ''),
+        ('PORound', '0'),
+        ('PaceAdjust', 'N'),
+        ('PerMode', 'PerGame'),
+        ('Period', '0'),
+        ('PlusMinus', 'N'),
+        ('Rank', 'N'),
+        ('Season', fetch_utils.season_string(year)),
+        ('SeasonSegment', ''),
+        ('SeasonType', 'Regular Season'),
+        ('ShotClockRange', ''),
+        ('TeamID', team_id),
+        ('VsConference', ''),
+        ('VsDivision', ''),
+    )
+    return 'https://stats.nba.com/stats/leaguedashlineups?' + urlencode(params)
+
+
+def fetch_lineups(url):
+    """
+    Get one team's lineups, going through the response cache so each (season, team, MeasureType) is only requested
+    once a day
+    Parameters
+    ----------
+    url : String
+        A leaguedashlineups URL
+
+    Returns
+    -------
+    The lineup dataframe
+    """
+    return fetch_utils.get_cached(url, lambda content: schema_utils.decode_result_set(content, 'leaguedashlineups'))
+
+
+def get_lineups(years, measure_types=('Advanced',), team_ids=fetch_utils.TEAM_IDS, workers=4):
+    """
+    Get every team's lineups for several seasons and MeasureTypes. All the requests go through one bounded pool,
+    paced by the stats.nba.com rate controller, and each MeasureType is assembled with a single concat.
+    Parameters
+    ----------
+    years : list of int
+        The years the seasons start in
+    measure_types : list of String
+        The MeasureTypes to get. Columns of later MeasureTypes that are not already in the first one are merged in.
+    team_ids : list of String
+    workers : int
+        Maximum number of requests in flight at once
+
+    Returns
+    -------
+    A dataframe with one row per lineup and season, with a SEASON column (the year the season starts in)
+    """
+    jobs = {lineup_url(year, team_id, measure_type): (year, measure_type)
+            for year in years for team_id in team_ids for measure_type in measure_types}
+
+    frames = {measure_type: [] for measure_type in measure_types}
+    for url, frame, error in fetch_utils.fetch_concurrently(jobs, fetch_lineups, workers=workers):
+        if error is not None:
+            raise error
+        year, measure_type = jobs[url]
+        frames[measure_type].append(frame.assign(SEASON=year))
+
+    lineups = None
+    for measure_type in measure_types:
+        frame = pd.concat(frames[measure_type], ignore_index=True)
+        if lineups is None:
+            lineups = frame
+        else:
+            new_columns = [column for column in frame.columns if column not in lineups.columns]
+            lineups = lineups.merge(frame[LINEUP_KEY + new_columns], on=LINEUP_KEY, how='left')
+    return lineups
@@ -1,4 +1,4 @@
-import math
+import pandas as pd
 
 # Constants
 event_type = 'EVENTMSGTYPE'
@@ -13,6 +13,9 @@ time_elapsed_period = 'TIME_ELAPSED_PERIOD'
 player1_id = 'PLAYER1_ID'
 player1_team_id = 'PLAYER1_TEAM_ID'
 player2_id = 'PLAYER2_ID'
+player2_team_id = 'PLAYER2_TEAM_ID'
+player3_id = 'PLAYER3_ID'
+player3_team_id = 'PLAYER3_TEAM_ID'
 
 
 """
@@ -128,6 +131,17 @@ Offensive fouls: Offensive, Charge
 """
 
 
+# Foul types that are technicals. These can be called on players sitting on the bench.
+technical_foul_types = [8, 11, 12, 13, 16, 19, 25, 30]
+
+
+def is_technical_foul(row):
+    # Also takes a dataframe of events, and then gives one boolean per event
+    if isinstance(row, pd.DataFrame):
+        return is_foul(row) & row[event_subtype].isin(technical_foul_types)
+    return is_foul(row) and row[event_subtype] in technical_foul_types
+
+
 def is_shooting_foul(row):
     return is_foul(row) and row[event_subtype] == 2
 
@@ -154,7 +168,7 @@ Not always labeled properly
 
 
 def is_team_rebound(row):
-    return is_rebound(row) and (row[event_subtype] == 1 or math.isnan(row[player1_team_id]))
+    return is_rebound(row) and (row[event_subtype] == 1 or pd.isna(row[player1_team_id]))
 
 
 def is_defensive_rebound(ind, row, rows):
@@ -289,7 +303,7 @@ def is_shot_clock_violation(row):
 
 
 def no_player_listed(row):
-    return math.isnan(row[player1_team_id])
+    return pd.isna(row[player1_team_id])
 
 
 def is_too_many_players_violation(row):
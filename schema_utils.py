@@ -0,0 +1,336 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Column types for the stats.nba.com endpoints we use. Player/team ids that can be missing (team events, empty
+# player slots) are nullable integers instead of floats, and text stays as Python strings with None for missing.
+# GAME_ID is an integer, which is how it comes back from every CSV we write. Columns that are not listed are
+# inferred.
+TEXT = 'object'
+# Text of the play-by-play datasets, held as a pandas string column
+STRING = 'string'
+# Text with only a few distinct values (team names, clock times), stored once per value
+CATEGORY = 'category'
+
+PLAY_BY_PLAY_SCHEMA = {
+    'GAME_ID': 'int64',
+    'EVENTNUM': 'int32',
+    'EVENTMSGTYPE': 'int8',
+    'EVENTMSGACTIONTYPE': 'int16',
+    'PERIOD': 'int8',
+    'WCTIMESTRING': CATEGORY,
+    'PCTIMESTRING': STRING,
+    'HOMEDESCRIPTION': STRING,
+    'NEUTRALDESCRIPTION': STRING,
+    'VISITORDESCRIPTION': STRING,
+    'SCORE': STRING,
+    'SCOREMARGIN': STRING,
+    'VIDEO_AVAILABLE_FLAG': 'Int8',
+}
+for player in ('PLAYER1', 'PLAYER2', 'PLAYER3'):
+    PLAY_BY_PLAY_SCHEMA.update({
+        f'PERSON{player[-1]}TYPE': 'Int8',
+        f'{player}_ID': 'Int64',
+        f'{player}_NAME': STRING,
+        f'{player}_TEAM_ID': 'Int64',
+        f'{player}_TEAM_CITY': CATEGORY,
+        f'{player}_TEAM_NICKNAME': CATEGORY,
+        f'{player}_TEAM_ABBREVIATION': CATEGORY,
+    })
+
+BOXSCORE_SCHEMA = {
+    'GAME_ID': 'int64',
+    'TEAM_ID': 'int64',
+    'TEAM_ABBREVIATION': TEXT,
+    'TEAM_CITY': TEXT,
+    'PLAYER_ID': 'int64',
+    'PLAYER_NAME': TEXT,
+    'NICKNAME': TEXT,
+    'START_POSITION': TEXT,
+    'COMMENT': TEXT,
+    'MIN': TEXT,
+}
+# Players that did not play have every counting stat missing
+for stat in ('FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A', 'FG3_PCT', 'FTM', 'FTA', 'FT_PCT', 'OREB', 'DREB', 'REB', 'AST',
+             'STL', 'BLK', 'TO', 'PF', 'PTS', 'PLUS_MINUS'):
+    BOXSCORE_SCHEMA[stat] = 'float64'
+
+PLAYER_STATS_SCHEMA = {
+    'PLAYER_ID': 'int64',
+    'PLAYER_NAME': TEXT,
+    'NICKNAME': TEXT,
+    'TEAM_ID': 'int64',
+    'TEAM_ABBREVIATION': TEXT,
+    'AGE': 'float64',
+    'GP': 'int16',
+    'W': 'int16',
+    'L': 'int16',
+}
+
+LINEUP_SCHEMA = {
+    'GROUP_SET': TEXT,
+    'GROUP_ID': TEXT,
+    'GROUP_NAME': TEXT,
+    'TEAM_ID': 'int64',
+    'TEAM_ABBREVIATION': TEXT,
+    'GP': 'int16',
+    'W': 'int16',
+    'L': 'int16',
+    'MIN': 'float64',
+}
+
+SHOT_CHART_SCHEMA = {
+    'GRID_TYPE': CATEGORY,
+    'GAME_ID': 'int64',
+    'GAME_EVENT_ID': 'int32',
+    'PLAYER_ID': 'int64',
+    'PLAYER_NAME': TEXT,
+    'TEAM_ID': 'int64',
+    'TEAM_NAME': CATEGORY,
+    'PERIOD': 'int8',
+    'MINUTES_REMAINING': 'int8',
+    'SECONDS_REMAINING': 'int8',
+    'EVENT_TYPE': CATEGORY,
+    'ACTION_TYPE': CATEGORY,
+    'SHOT_TYPE': CATEGORY,
+    'SHOT_ZONE_BASIC': CATEGORY,
+    'SHOT_ZONE_AREA': CATEGORY,
+    'SHOT_ZONE_RANGE': CATEGORY,
+    'SHOT_DISTANCE': 'int16',
+    'LOC_X': 'int16',
+    'LOC_Y': 'int16',
+    'SHOT_ATTEMPTED_FLAG': 'int8',
+    'SHOT_MADE_FLAG': 'int8',
+    'GAME_DATE': TEXT,
+    'HTM': CATEGORY,
+    'VTM': CATEGORY,
+}
+
+ENDPOINT_SCHEMAS = {
+    'playbyplayv2': PLAY_BY_PLAY_SCHEMA,
+    'boxscoretraditionalv2': BOXSCORE_SCHEMA,
+    'leaguedashplayerstats': PLAYER_STATS_SCHEMA,
+    'shotchartdetail': SHOT_CHART_SCHEMA,
+    'leaguedashlineups': LINEUP_SCHEMA,
+}
+
+# Column types of the datasets we save (by the name before the _{year} in their file names). Every dataset is cast
+# to its schema when it is written and when it is read, whatever format it is stored in.
+PAP_SCHEMA = {
+    'GAME_ID': 'int64',
+    'TEAM_ID_1': 'int64',
+    'TEAM_ID_2': 'int64',
+    'PERIOD': 'int8',
+}
+for team in (1, 2):
+    for i in range(1, 6):
+        PAP_SCHEMA[f'TEAM_{team}_PLAYER_{i}'] = 'Int64'
+
+# The play-by-play plus the possession each event belongs to
+POSSESSION_SCHEMA = dict(PLAY_BY_PLAY_SCHEMA, **{
+    'team_1_id': 'Int64',
+    'team_2_id': 'Int64',
+    'game_id': 'int64',
+    'period': 'Int8',
+    'possession_start': 'float64',
+    'possession_end': 'float64',
+    'team_1_points': 'Int8',
+    'team_2_points': 'Int8',
+    'possession_team': 'Int64',
+    'possession_id': 'int16',
+    'sec': 'int16',
+    'desc': STRING,
+})
+for team in (1, 2):
+    for i in range(1, 6):
+        POSSESSION_SCHEMA[f'team_{team}_player_{i}'] = 'Int64'
+
+ESPN_GAME_SCHEMA = {
+    'GAME_ID': 'int64',
+    'GAME_DATE': STRING,
+    'away_tm': CATEGORY,
+    'away_tm_abbr': CATEGORY,
+    'home_tm': CATEGORY,
+    'home_tm_abbr': CATEGORY,
+}
+
+ESPN_WP_SCHEMA = dict(ESPN_GAME_SCHEMA, **{
+    'time': 'float64',
+    'wp_h': 'float64',
+    'sec': 'float64',
+    'home_wp': 'float64',
+    'wp_source': CATEGORY,
+})
+
+COMPLETE_PBP_SCHEMA = dict(POSSESSION_SCHEMA, **ESPN_GAME_SCHEMA, **{
+    'sec': 'float64',
+    'road_wp': 'float64',
+    'home_wp': 'float64',
+    'road_wp_prev': 'float64',
+    'home_wp_prev': 'float64',
+    'road_wpa': 'float64',
+    'home_wpa': 'float64',
+})
+
+DATASET_SCHEMAS = {
+    'reg_pbp': PLAY_BY_PLAY_SCHEMA,
+    'pap': PAP_SCHEMA,
+    'full_reg_pbp': POSSESSION_SCHEMA,
+    'complete_pbp': COMPLETE_PBP_SCHEMA,
+    'espn_wp': ESPN_WP_SCHEMA,
+}
+
+# numpy integer types can't hold missing values, so fall back to the matching pandas nullable type
+NULLABLE_INTS = {'int8': 'Int8', 'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64'}
+
+
+def cast_column(column, dtype):
+    """
+    Cast a column to a declared type. Columns read back from CSV come in as floats (ids with missing values) or as
+    numbers that should be text (e.g. a SCOREMARGIN column without a TIE), so those are converted first.
+    Parameters
+    ----------
+    column : pandas Series
+    dtype : String
+
+    Returns
+    -------
+    The cast Series
+    """
+    if str(column.dtype) == dtype:
+        return column
+    if dtype in NULLABLE_INTS or dtype in NULLABLE_INTS.values():
+        if not pd.api.types.is_numeric_dtype(column):
+            column = pd.to_numeric(column)
+        if dtype in NULLABLE_INTS and column.isna().any():
+            dtype = NULLABLE_INTS[dtype]
+        return column.astype(dtype)
+    if dtype.startswith('float'):
+        return pd.to_numeric(column).astype(dtype)
+    if dtype in (STRING, CATEGORY) and pd.api.types.is_float_dtype(column):
+        # 5.0 -> "5"
+        rounded = column.round()
+        if (rounded == column).fillna(True).all():
+            column = rounded.astype('Int64')
+    if dtype in (STRING, CATEGORY):
+        column = column.astype(STRING)
+    return column.astype(dtype)
+
+
+def apply_schema(frame, schema):
+    """
+    Cast the columns of a dataframe to a schema. Columns not in the schema are left alone.
+    Parameters
+    ----------
+    frame : pandas DataFrame
+    schema : dict or String
+        A schema, or the name of a dataset in DATASET_SCHEMAS
+
+    Returns
+    -------
+    The dataframe
+    """
+    if isinstance(schema, str):
+        schema = DATASET_SCHEMAS.get(schema, {})
+    columns = {column: cast_column(frame[column], dtype) for column, dtype in schema.items()
+               if column in frame.columns and str(frame[column].dtype) != dtype}
+    if not columns:
+        return frame
+    return frame.assign(**columns)
+
+
+def load_json(content):
+    """
+    Parse a JSON response, using orjson if it is installed
+    Parameters
+    ----------
+    content : bytes or String
+
+    Returns
+    -------
+    The parsed JSON
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def endpoint_from_url(url):
+    """
+    Get the stats.nba.com endpoint name from a URL
+    Parameters
+    ----------
+    url : String
+        e.g. https://stats.nba.com/stats/playbyplayv2/?gameId=...
+
+    Returns
+    -------
+    The endpoint name, e.g. playbyplayv2
+    """
+    path = url.split('?')[0].rstrip('/')
+    return path.split('/')[-1]
+
+
+def to_column(values, dtype):
+    """
+    Build a typed column from the values of one column of a rowSet
+    Parameters
+    ----------
+    values : tuple
+    dtype : String
+        The declared type, or None to infer it
+
+    Returns
+    -------
+    A numpy array, pandas extension array or Series
+    """
+    if dtype is None:
+        return pd.Series(values)
+    if dtype == TEXT:
+        return np.array(values, dtype=object)
+    if dtype in NULLABLE_INTS:
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            return pd.array(values, dtype=NULLABLE_INTS[dtype])
+    if dtype.startswith('float'):
+        return np.array(values, dtype=dtype)
+    return pd.array(values, dtype=dtype)
+
+
+def decode_result_set(content, endpoint=None, index=0):
+    """
+    Decode a stats.nba.com response straight into a typed dataframe. The rowSet is transposed into columns and each
+    column is built with the type declared for the endpoint, instead of building the frame from a list of rows and
+    letting pandas guess.
+    Parameters
+    ----------
+    content : bytes or String
+        The raw response body
+    endpoint : String
+        The endpoint name, used to look up the schema
+    index : int
+        Which result set to decode
+
+    Returns
+    -------
+    The pandas dataframe
+    """
+    resp = load_json(content)
+    results = resp['resultSets'][index]
+    headers = results['headers']
+    rows = results['rowSet']
+    schema = ENDPOINT_SCHEMAS.get(endpoint, {})
+
+    columns = zip(*rows) if rows else [()] * len(headers)
+    # Columns are keyed by position since a few endpoints repeat header names
+    data = {i: to_column(values, schema.get(header)) for i, (header, values) in enumerate(zip(headers, columns))}
+    frame = pd.DataFrame(data, columns=range(len(headers)))
+    frame.columns = headers
+    return frame
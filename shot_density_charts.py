@@ -1,10 +1,9 @@
-import requests
+import shot_utils
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle, Rectangle, Arc
 from matplotlib.offsetbox import OffsetImage
 import pandas as pd
 import seaborn as sns
-import urllib.request
 import numbers
 from matplotlib import rcParams
 
@@ -20,19 +19,6 @@ player_id = str(player_id['nba_id'].iloc[0])
 
 player_season = str(year) + '-' + str((year % 1000) + 1)
 
-header_data = {
-    'Connection': 'keep-alive',
-    'Accept': 'application/json, text/plain, */*',
-    'x-nba-stats-token': 'true',
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36',
-    'x-nba-stats-origin': 'stats',
-    'Sec-Fetch-Site': 'same-origin',
-    'Sec-Fetch-Mode': 'cors',
-    'Referer': 'https://stats.nba.com/',
-    'Accept-Encoding': 'gzip, deflate, br',
-    'Accept-Language': 'en-US,en;q=0.9',
-}
-
 
 def draw_court(ax=None, color='black', lw=2, outer_lines=True):
     # If an axes object isn't provided to plot onto, just get current one
@@ -88,24 +74,8 @@ def draw_court(ax=None, color='black', lw=2, outer_lines=True):
     return ax
 
 
-shot_chart_url = 'http://stats.nba.com/stats/shotchartdetail?CFID=33&CFPAR' \
-                 'AMS=' + player_season + '&ContextFilter=&ContextMeasure=FGA&DateFrom=&D' \
-                                          'ateTo=&GameID=&GameSegment=&LastNGames=0&LeagueID=00&Loca' \
-                                          'tion=&MeasureType=Base&Month=0&OpponentTeamID=0&Outcome=&' \
-                                          'PaceAdjust=N&PerMode=PerGame&Period=0&PlayerID=' + player_id + '&Plu' \
-                                                                                                          'sMinus=N&PlayerPosition=&Rank=N&RookieYear=&Season=' + player_season + '&Seas' \
-                                                                                                                                                                                  'onSegment=&SeasonType=Regular+Season&TeamID=0&VsConferenc' \
-                                                                                                                                                                                  'e=&VsDivision=&mode=Advanced&showDetails=0&showShots=1&sh' \
-                                                                                                                                                                                  'owZones=0'
-
-# Get the webpage containing the data
-response = requests.get(shot_chart_url, headers=header_data)
-# Grab the headers to be used as column headers for our DataFrame
-headers = response.json()['resultSets'][0]['headers']
-# Grab the shot chart data
-shots = response.json()['resultSets'][0]['rowSet']
-
-shot_df = pd.DataFrame(shots, columns=headers)
+# Read the player's shots from the local league-wide shot store
+shot_df = shot_utils.load_shots(year, player_id=player_id)
 shot_df = shot_df[['PLAYER_ID', 'PLAYER_NAME', 'LOC_X', 'LOC_Y', 'SHOT_MADE_FLAG']]
 
 for x in range(0, len(shot_df)):
@@ -113,9 +83,7 @@ for x in range(0, len(shot_df)):
     if booler != True:
         print(booler)
 
-pic = urllib.request.urlretrieve(
-    "http://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/260x190/" + player_id + ".png",
-    player_id + ".png")
+pic = shot_utils.get_headshot(player_id)
 
 sns.set_style("white")
 sns.set_color_codes()
@@ -143,7 +111,7 @@ ax.tick_params(labelbottom='off', labelleft='off')
 ax.set_title(player_name.title() + ' Shot Density Chart \n' + player_season + ' Regular Season',
              y=1.0, fontsize=18, loc='left')
 
-player_pic = plt.imread(pic[0])
+player_pic = plt.imread(pic)
 img = OffsetImage(player_pic, zoom=0.53)
 
 img.set_offset((1600, 1525))
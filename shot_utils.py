@@ -0,0 +1,139 @@
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import fetch_utils
+import schema_utils
+
+# A shot is uniquely identified by its game and event
+SHOT_KEY = ['GAME_ID', 'GAME_EVENT_ID']
+
+
+def shot_chart_url(year, team_id=0, player_id=0, date_from=''):
+    """
+    Get the shotchartdetail endpoint for every shot a team (or player) took in a season
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    team_id : String
+        0 for every team
+    player_id : String
+        0 for every player
+    date_from : String
+        Only include games on or after this date (MM/DD/YYYY)
+
+    Returns
+    -------
+    The URL
+    """
+    season = fetch_utils.season_string(year)
+    return f"https://stats.nba.com/stats/shotchartdetail?CFID=33&CFPARAMS={season}&ContextFilter=" \
+           f"&ContextMeasure=FGA&DateFrom={date_from}&DateTo=&GameID=&GameSegment=&LastNGames=0&LeagueID=00" \
+           f"&Location=&MeasureType=Base&Month=0&OpponentTeamID=0&Outcome=&PaceAdjust=N&PerMode=PerGame&Period=0" \
+           f"&PlayerID={player_id}&PlusMinus=N&PlayerPosition=&Rank=N&RookieYear=&Season={season}" \
+           f"&SeasonSegment=&SeasonType=Regular+Season&TeamID={team_id}&VsConference=&VsDivision=&mode=Advanced" \
+           f"&showDetails=0&showShots=1&showZones=0"
+
+
+def shot_store_path(year):
+    return Path.cwd() / "DataPack" / "Shots" / f"shots_{year}.parquet"
+
+
+def fetch_team_shots(url):
+    r = fetch_utils.get(url)
+    r.raise_for_status()
+    return schema_utils.decode_result_set(r.content, 'shotchartdetail')
+
+
+def update_shot_store(year, workers=4):
+    """
+    Pull every shot of the season into the local shot store, one request per team. If the store already exists,
+    only the games since the last stored game date are requested and appended.
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    workers : int
+        Maximum number of requests in flight at once. Requests are paced by the stats.nba.com rate controller.
+
+    Returns
+    -------
+    The full shot dataframe for the season
+    """
+    path = shot_store_path(year)
+    existing = None
+    date_from = ''
+    if os.path.isfile(path):
+        existing = pd.read_parquet(path)
+        if len(existing) > 0:
+            # Re-request the last stored day in case it was only partially played when we last updated
+            last_date = datetime.strptime(str(existing['GAME_DATE'].max()), "%Y%m%d") - timedelta(days=1)
+            date_from = last_date.strftime("%m/%d/%Y")
+
+    urls = [shot_chart_url(year, team_id=tid, date_from=date_from) for tid in fetch_utils.TEAM_IDS]
+    frames = [] if existing is None else [existing]
+    for url, frame, error in fetch_utils.fetch_concurrently(urls, fetch_team_shots, workers=workers):
+        if error is not None:
+            raise error
+        frames.append(frame)
+
+    shots = pd.concat(frames, ignore_index=True)
+    # Concatenating categoricals with different categories falls back to object, so restore the declared types
+    shots = shots.astype({column: dtype for column, dtype in schema_utils.SHOT_CHART_SCHEMA.items()
+                          if dtype == schema_utils.CATEGORY and column in shots.columns})
+    shots = shots.drop_duplicates(subset=SHOT_KEY, keep='last').sort_values(SHOT_KEY, ignore_index=True)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    shots.to_parquet(path, index=False)
+    return shots
+
+
+def load_shots(year, player_id=None, team_id=None):
+    """
+    Get shots from the local shot store. The store is only built (with network calls) if it doesn't exist yet;
+    run update_shot_store to pick up new games.
+    Parameters
+    ----------
+    year : int
+        The year the season starts in
+    player_id : int or String
+        Only get this player's shots
+    team_id : int or String
+        Only get this team's shots
+
+    Returns
+    -------
+    A dataframe of shots, in the same format as the shotchartdetail endpoint
+    """
+    path = shot_store_path(year)
+    if not os.path.isfile(path):
+        update_shot_store(year)
+
+    filters = []
+    if player_id is not None:
+        filters.append(('PLAYER_ID', '==', int(player_id)))
+    if team_id is not None:
+        filters.append(('TEAM_ID', '==', int(team_id)))
+    return pd.read_parquet(path, filters=filters or None)
+
+
+def get_headshot(player_id):
+    """
+    Get a player's headshot, downloading it only the first time
+    Parameters
+    ----------
+    player_id : String
+
+    Returns
+    -------
+    The path to the image
+    """
+    path = Path.cwd() / "DataPack" / "Headshots" / f"{player_id}.png"
+    if not os.path.isfile(path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fetch_utils.download(
+            f"http://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/260x190/{player_id}.png", path)
+    return path
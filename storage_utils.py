@@ -0,0 +1,594 @@
+import json
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schema_utils
+
+# Storage format of each season dataset, by the name before the _{year} in its file name. Datasets not listed here
+# are written as CSV.
+DATASET_FORMATS = {
+    'reg_pbp': 'parquet',
+    'pap': 'parquet',
+    'full_reg_pbp': 'parquet',
+    'complete_pbp': 'parquet',
+    'espn_wp': 'parquet',
+}
+
+FORMATS = ('csv', 'parquet')
+
+COMPRESSION = 'zstd'
+
+# Rows per Parquet row group. Rows are kept in game order, so the GAME_ID statistics of each row group let a read of a
+# few games skip most of the file.
+ROW_GROUP_SIZE = 64 * 1024
+
+# A season is compacted back into one file once it has this many per-game segments
+COMPACT_SEGMENTS = 256
+
+# Key of our own entry in the Parquet schema metadata
+METADATA_KEY = b'nba_stats'
+FORMAT_VERSION = 1
+
+SEASON_FILE = re.compile(r'^(?P<dataset>.+)_(?P<season>\d{4})(\.(csv|parquet))?$')
+
+
+def set_format(dataset, fmt):
+    """
+    Choose how a dataset is stored from now on
+    Parameters
+    ----------
+    dataset : String
+        e.g. reg_pbp
+    fmt : String
+        One of FORMATS
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}, expected one of {FORMATS}")
+    DATASET_FORMATS[dataset] = fmt
+
+
+def split_filename(filename):
+    """
+    Get the dataset and season of a season file name
+    Parameters
+    ----------
+    filename : String
+        e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The dataset name and the season, e.g. (reg_pbp, 2023), or (None, None) if it isn't a season file
+    """
+    match = SEASON_FILE.match(Path(filename).name)
+    if match is None:
+        return None, None
+    return match.group('dataset'), int(match.group('season'))
+
+
+def storage_format(filename):
+    dataset, season = split_filename(filename)
+    if dataset is None:
+        return 'csv'
+    return DATASET_FORMATS.get(dataset, 'csv')
+
+
+def season_dir(directory, dataset, season):
+    return Path(directory) / dataset / f"season={season}"
+
+
+def partition_path(directory, dataset, season):
+    """
+    Get the single-file layout of one season of a Parquet dataset, written before seasons were stored as segments.
+    It is still read, and becomes the first base of the season the next time the season is written.
+    Parameters
+    ----------
+    directory : Path
+        e.g. DataPack
+    dataset : String
+    season : int
+
+    Returns
+    -------
+    The path, e.g. DataPack/reg_pbp/season=2023/part-0.parquet
+    """
+    return season_dir(directory, dataset, season) / "part-0.parquet"
+
+
+def manifest_path(directory, dataset, season):
+    return season_dir(directory, dataset, season) / "manifest.json"
+
+
+def csv_path(directory, filename):
+    return Path(directory) / f"{Path(filename).stem}.csv"
+
+
+def dataset_path(directory, filename):
+    """
+    Get where a dataset file is stored in its current format
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        The name the dataset has always had, e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The manifest of the Parquet season or the CSV file
+    """
+    if storage_format(filename) == 'parquet':
+        dataset, season = split_filename(filename)
+        return manifest_path(directory, dataset, season)
+    return csv_path(directory, filename)
+
+
+def saved_path(directory, filename):
+    """
+    Get the file a dataset was saved to. Older layouts (a single Parquet file, or a CSV written before the dataset
+    moved to Parquet) still count until the season is next written.
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+
+    Returns
+    -------
+    The path of the saved file, or where it will be saved if there is none yet
+    """
+    path = dataset_path(directory, filename)
+    if path.is_file():
+        return path
+    dataset, season = split_filename(filename)
+    candidates = [csv_path(directory, filename)]
+    if dataset is not None:
+        candidates.insert(0, partition_path(directory, dataset, season))
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate
+    return path
+
+
+def exists(directory, filename):
+    """
+    Check if a dataset file was saved, in any format
+    """
+    return saved_path(directory, filename).is_file()
+
+
+def to_arrow(frame):
+    """
+    Convert a dataframe to an Arrow table. Columns that mix numbers and strings (e.g. SCOREMARGIN after a CSV round
+    trip) are stored as strings.
+    Parameters
+    ----------
+    frame : pandas DataFrame
+
+    Returns
+    -------
+    The pyarrow Table
+    """
+    try:
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    frame = frame.copy()
+    for column in frame.columns[frame.dtypes == object]:
+        try:
+            pa.array(frame[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            frame[column] = frame[column].where(frame[column].isna(), frame[column].astype(str))
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def write_parquet(frame, path, dataset=None, season=None):
+    """
+    Write a dataframe to a compressed Parquet file, with the dataset, season and row/game counts in the schema
+    metadata. The file is written next to its final path and then renamed, so readers never see half a file.
+    Parameters
+    ----------
+    frame : pandas DataFrame
+    path : Path
+    dataset : String
+    season : int
+    """
+    table = to_arrow(frame)
+    info = {
+        'dataset': dataset,
+        'season': season,
+        'format_version': FORMAT_VERSION,
+        'rows': table.num_rows,
+        'games': int(frame['GAME_ID'].nunique()) if 'GAME_ID' in frame.columns else None,
+        'written_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(info).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.partial')
+    pq.write_table(table, partial, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(partial, path)
+
+
+def read_metadata(path):
+    """
+    Get our schema metadata of a Parquet file without reading any rows
+    Parameters
+    ----------
+    path : Path
+
+    Returns
+    -------
+    A dictionary with the dataset, season, format_version, rows, games and written_at, or None if there is none
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    if METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+
+def read_manifest(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(path, manifest):
+    # Written then renamed: the manifest is what makes new files part of the season, so it must never be half written
+    partial = path.with_suffix('.partial')
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(partial, path)
+
+
+def new_manifest(dataset, season):
+    """
+    Get the manifest of an empty season. A season is a base file, holding every game up to the last compaction, plus
+    one immutable segment file per game added since, in the order they were added. A game written again gets a new
+    segment, which replaces its rows in the base and in any older segment.
+    Parameters
+    ----------
+    dataset : String
+    season : int
+
+    Returns
+    -------
+    The manifest dictionary
+    """
+    return {'dataset': dataset, 'season': season, 'format_version': FORMAT_VERSION, 'generation': 0,
+            'base': None, 'segments': [], 'next_segment': 0}
+
+
+def load_manifest(directory, filename):
+    """
+    Get the manifest of a Parquet season. A season saved in an older layout is moved into a base file first.
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+
+    Returns
+    -------
+    The manifest dictionary
+    """
+    dataset, season = split_filename(filename)
+    path = manifest_path(directory, dataset, season)
+    if path.is_file():
+        return read_manifest(path)
+
+    manifest = new_manifest(dataset, season)
+    if exists(directory, filename):
+        print(f"Moving {saved_path(directory, filename)} into {season_dir(directory, dataset, season)}")
+        manifest = write_base(read(directory, filename), directory, dataset, season, manifest)
+    return manifest
+
+
+def remove_files(folder, names):
+    for name in names:
+        try:
+            os.remove(folder / name)
+        except FileNotFoundError:
+            pass
+
+
+def write_base(frame, directory, dataset, season, manifest):
+    """
+    Replace a season with one base file holding frame, and no segments
+    Parameters
+    ----------
+    frame : pandas DataFrame
+    directory : Path
+    dataset : String
+    season : int
+    manifest : dict
+        The season's current manifest
+
+    Returns
+    -------
+    The new manifest
+    """
+    folder = season_dir(directory, dataset, season)
+    generation = manifest['generation'] + 1
+    name = f"part-{generation}.parquet"
+    write_parquet(frame, folder / name, dataset, season)
+
+    old_files = [segment['file'] for segment in manifest['segments']]
+    if manifest['base'] is not None:
+        old_files.append(manifest['base']['file'])
+    games = [int(gid) for gid in pd.unique(frame['GAME_ID'])] if 'GAME_ID' in frame.columns else []
+
+    manifest = dict(manifest, generation=generation, segments=[],
+                    base={'file': name, 'rows': len(frame), 'games': games})
+    write_manifest(manifest_path(directory, dataset, season), manifest)
+
+    # Only once the new manifest is in place are the files it replaced deleted
+    remove_files(folder, old_files)
+    remove_files(folder, ["part-0.parquet"])
+    return manifest
+
+
+def compact(directory, filename):
+    """
+    Merge a season's base and segments back into a single base file, so reads open one file again
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The new manifest
+    """
+    dataset, season = split_filename(filename)
+    manifest = load_manifest(directory, filename)
+    return write_base(read(directory, filename), directory, dataset, season, manifest)
+
+
+def append_games(frame, directory, filename):
+    """
+    Add games to a season without touching the games already saved. Each game is written to its own segment file and
+    then the manifest is updated, so the cost is proportional to the new games only. Games already saved are
+    replaced. Once there are COMPACT_SEGMENTS segments, the season is compacted.
+    Datasets stored as CSV are rewritten in full.
+    Parameters
+    ----------
+    frame : pandas DataFrame
+        The rows of the new games, with a GAME_ID column
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+
+    Returns
+    -------
+    The number of games written
+    """
+    frame = schema_utils.apply_schema(frame, split_filename(filename)[0] or {})
+    game_ids = pd.unique(frame['GAME_ID'])
+    if storage_format(filename) != 'parquet':
+        if exists(directory, filename):
+            existing = read(directory, filename)
+            existing = existing.loc[~existing['GAME_ID'].isin(game_ids)]
+            frame = pd.concat([existing, frame], ignore_index=True)
+        save(frame, directory, filename)
+        return len(game_ids)
+
+    dataset, season = split_filename(filename)
+    folder = season_dir(directory, dataset, season)
+    manifest = load_manifest(directory, filename)
+
+    added = []
+    for game_id, game in frame.groupby('GAME_ID', sort=False):
+        # Segment files are never overwritten, a game written again gets a new file
+        number = manifest['next_segment']
+        manifest['next_segment'] += 1
+        name = f"segments/{int(game_id):010d}-{number}.parquet"
+        write_parquet(game, folder / name, dataset, season)
+        added.append({'game_id': int(game_id), 'file': name, 'rows': len(game)})
+
+    replaced = {segment['game_id'] for segment in added}
+    old_files = [segment['file'] for segment in manifest['segments'] if segment['game_id'] in replaced]
+    manifest['segments'] = [segment for segment in manifest['segments'] if segment['game_id'] not in replaced] + added
+    folder.mkdir(parents=True, exist_ok=True)
+    write_manifest(manifest_path(directory, dataset, season), manifest)
+    remove_files(folder, old_files)
+
+    if len(manifest['segments']) >= COMPACT_SEGMENTS:
+        compact(directory, filename)
+    return len(added)
+
+
+def save(frame, directory, filename, fmt=None):
+    """
+    Save a dataframe in the format chosen for its dataset. A Parquet season is replaced as a whole.
+    Parameters
+    ----------
+    frame : pandas DataFrame
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+    fmt : String
+        One of FORMATS, to override the dataset's format
+
+    Returns
+    -------
+    The path written
+    """
+    frame = schema_utils.apply_schema(frame, split_filename(filename)[0] or {})
+    fmt = fmt or storage_format(filename)
+    if fmt == 'parquet':
+        dataset, season = split_filename(filename)
+        if dataset is None:
+            path = Path(directory) / f"{Path(filename).stem}.parquet"
+            write_parquet(frame, path)
+            return path
+        path = manifest_path(directory, dataset, season)
+        manifest = read_manifest(path) if path.is_file() else new_manifest(dataset, season)
+        write_base(frame, directory, dataset, season, manifest)
+        return path
+
+    path = csv_path(directory, filename)
+    frame.to_csv(path, index=False)
+    return path
+
+
+def concat_tables(tables):
+    """
+    Put the tables of a season's files together. A column can come out as a different type in different games (e.g.
+    all null in one game), so types are widened where they have to be.
+    """
+    if len(tables) == 1:
+        return tables[0].to_pandas()
+    try:
+        return pa.concat_tables(tables, promote_options='permissive').to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pd.concat([table.to_pandas() for table in tables], ignore_index=True)
+
+
+def read_season(directory, filename, columns=None, game_ids=None):
+    """
+    Read a Parquet season from its manifest: the base file first, then every segment in the order it was added
+    """
+    dataset, season = split_filename(filename)
+    folder = season_dir(directory, dataset, season)
+    manifest = read_manifest(manifest_path(directory, dataset, season))
+    wanted = None if game_ids is None else {int(gid) for gid in game_ids}
+
+    segments = [segment for segment in manifest['segments'] if wanted is None or segment['game_id'] in wanted]
+    # Games in a segment were written again after the base, so their rows in the base are out of date
+    replaced = [segment['game_id'] for segment in manifest['segments']]
+
+    tables = []
+    base = manifest['base']
+    if base is not None and (wanted is None or wanted & set(base['games'])):
+        filters = []
+        if wanted is not None:
+            filters.append(('GAME_ID', 'in', sorted(wanted)))
+        if replaced:
+            filters.append(('GAME_ID', 'not in', replaced))
+        tables.append(pq.read_table(folder / base['file'], columns=columns, filters=filters or None))
+    tables += [pq.read_table(folder / segment['file'], columns=columns) for segment in segments]
+
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    return concat_tables(tables)
+
+
+def stored_game_ids(directory, filename):
+    """
+    Get the games saved in a dataset file. For a Parquet season this comes from the manifest without reading any rows.
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+
+    Returns
+    -------
+    A list of game ids as ints, in the order they were saved
+    """
+    path = saved_path(directory, filename)
+    if path.name == 'manifest.json':
+        manifest = read_manifest(path)
+        replaced = {segment['game_id'] for segment in manifest['segments']}
+        base = manifest['base']['games'] if manifest['base'] is not None else []
+        return [gid for gid in base if gid not in replaced] + [segment['game_id'] for segment in manifest['segments']]
+    return [int(gid) for gid in pd.unique(read(directory, filename, columns=['GAME_ID'])['GAME_ID'])]
+
+
+def read(directory, filename, columns=None, game_ids=None):
+    """
+    Read a dataset file saved by save or append_games as one table, whatever layout it is stored in, with the column
+    types of its schema in schema_utils
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+    columns : list of String
+        Only read these columns. None reads all of them
+    game_ids : list
+        Only read these games. None reads all of them
+
+    Returns
+    -------
+    The dataframe
+    """
+    path = saved_path(directory, filename)
+    if path.name == 'manifest.json':
+        frame = read_season(directory, filename, columns, game_ids)
+    elif path.suffix == '.parquet':
+        filters = None
+        if game_ids is not None:
+            filters = [('GAME_ID', 'in', [int(gid) for gid in game_ids])]
+        frame = pd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        frame = pd.read_csv(path, usecols=columns)
+        if game_ids is not None:
+            frame = frame.loc[frame['GAME_ID'].isin([int(gid) for gid in game_ids])].reset_index(drop=True)
+    return schema_utils.apply_schema(frame, split_filename(filename)[0] or {})
+
+
+def export_csv(directory, filename, output=None):
+    """
+    Write a CSV copy of a dataset file, whatever format it is stored in
+    Parameters
+    ----------
+    directory : Path
+    filename : String
+        e.g. reg_pbp_2023.csv
+    output : Path
+        Where to write it. Defaults to {directory}/{filename}
+
+    Returns
+    -------
+    The path written
+    """
+    output = Path(output) if output is not None else csv_path(directory, filename)
+    read(directory, filename).to_csv(output, index=False)
+    return output
+
+
+def load_dataset(dataset, seasons=None, directory=None, columns=None):
+    """
+    Read several seasons of a dataset into one dataframe, e.g. for analysis
+    Parameters
+    ----------
+    dataset : String
+        e.g. complete_pbp
+    seasons : list of int
+        None reads every season saved
+    directory : Path
+        Defaults to DataPack
+    columns : list of String
+        Only read these columns. None reads all of them
+
+    Returns
+    -------
+    The dataframe, with a season column
+    """
+    directory = Path(directory) if directory is not None else Path.cwd() / "DataPack"
+    if seasons is None:
+        found = {int(path.name.split('=')[1]) for path in (directory / dataset).glob("season=*")}
+        found |= {split_filename(path.name)[1] for path in directory.glob(f"{dataset}_*.csv")
+                  if split_filename(path.name)[0] == dataset}
+        seasons = sorted(found)
+
+    frames = [read(directory, f"{dataset}_{season}.csv", columns=columns).assign(season=season)
+              for season in seasons if exists(directory, f"{dataset}_{season}.csv")]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    import sys
+
+    # e.g. python storage_utils.py reg_pbp_2023.csv writes DataPack/reg_pbp_2023.csv from the Parquet partition
+    for name in sys.argv[1:]:
+        print(f"Wrote {export_csv(Path.cwd() / 'DataPack', name)}")
@@ -0,0 +1,39 @@
+import pandas as pd
+
+import data_utils
+import event_store_utils
+import schema_utils
+
+GAME_ID = '0022300001'
+HOME, AWAY = 1610612737, 1610612738
+
+
+def event(eventnum, msg_type, player1=None, team1=None, player2=None, team2=None):
+    return {'GAME_ID': int(GAME_ID), 'EVENTNUM': eventnum, 'EVENTMSGTYPE': msg_type, 'EVENTMSGACTIONTYPE': 1,
+            'PERIOD': 1, 'PCTIMESTRING': '11:00', 'PLAYER1_ID': player1, 'PLAYER1_TEAM_ID': team1,
+            'PLAYER2_ID': player2, 'PLAYER2_TEAM_ID': team2, 'PLAYER3_ID': None, 'PLAYER3_TEAM_ID': None}
+
+
+def typed_game():
+    # Home player 5 plays the whole period without showing up, so the starters have to come from the boxscore.
+    # Player 11 comes in for player 1 and must not count as a starter.
+    events = [event(n, 1, player, HOME) for n, player in enumerate([1, 2, 3, 4], start=1)]
+    events += [event(n, 1, player, AWAY) for n, player in enumerate([6, 7, 8, 9, 10], start=5)]
+    events.append(event(10, 8, 1, HOME, 11, HOME))
+    frame = schema_utils.apply_schema(pd.DataFrame(events), 'reg_pbp')
+    return event_store_utils.EventStore.from_frame(frame, 'reg_pbp')
+
+
+def test_boxscore_fallback_on_schema_typed_game(monkeypatch):
+    boxscore = pd.DataFrame({'PLAYER_NAME': [''] * 11, 'PLAYER_ID': list(range(1, 12)),
+                             'TEAM_ID': [HOME] * 5 + [AWAY] * 5 + [HOME]})
+    monkeypatch.setattr(data_utils, 'extract_data', lambda url: boxscore.copy())
+
+    store = typed_game()
+    assert store.game(GAME_ID)['EVENTNUM'].dtype == 'int32'
+
+    pap = data_utils.players_at_period(store, GAME_ID)
+    assert len(pap) == 1
+    row = pap.iloc[0]
+    starters = {row['TEAM_ID_1']: sorted(row['TEAM_1_PLAYERS']), row['TEAM_ID_2']: sorted(row['TEAM_2_PLAYERS'])}
+    assert starters == {HOME: [1, 2, 3, 4, 5], AWAY: [6, 7, 8, 9, 10]}
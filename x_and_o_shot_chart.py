@@ -1,11 +1,10 @@
-import requests
+import shot_utils
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle, Rectangle, Arc
 from matplotlib.offsetbox import OffsetImage
 from matplotlib import rcParams
 import pandas as pd
 import seaborn as sns
-import urllib.request
 import numpy as np
 import time
 import sys
@@ -21,9 +20,11 @@ from datetime import datetime
 rcParams['font.family'] = 'monospace'
 
 pd.set_option('display.max_columns', 30)
+year = 2020
+player_season = str(year) + '-' + str((year % 1000) + 1)
 # player_names = pd.read_csv("player_id_matches_2020.csv")
 player_names = pd.read_csv("player_id_matches_2021.csv")
-team_names = pd.read_csv("stats_nba_player_data_2020-21.csv")
+team_names = pd.read_csv(f"stats_nba_player_data_{player_season}.csv")
 plays = pd.read_csv("pbp_1222_with_defending_team.csv")
 teams = pd.read_csv("team_id_matches")
 
@@ -52,24 +53,9 @@ while(counter == 0):
         counter+=1
     i+=1
 
-player_season = '2020-21'
 # player_id = '203552'
 
 
-header_data  = {
-   'Connection': 'keep-alive',
-   'Accept': 'application/json, text/plain, */*',
-   'x-nba-stats-token': 'true',
-   'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36',
-   'x-nba-stats-origin': 'stats',
-   'Sec-Fetch-Site': 'same-origin',
-   'Sec-Fetch-Mode': 'cors',
-   'Referer': 'https://stats.nba.com/',
-   'Accept-Encoding': 'gzip, deflate, br',
-   'Accept-Language': 'en-US,en;q=0.9',
-}
-
-
 def draw_court(ax=None, color='black', lw=2, outer_lines=False):
    # If an axes object isn't provided to plot onto, just get current one
    if ax is None:
@@ -122,28 +108,8 @@ def draw_court(ax=None, color='black', lw=2, outer_lines=False):
        ax.add_patch(element)
    return ax
 
-shot_chart_url = 'http://stats.nba.com/stats/shotchartdetail?CFID=33&CFPAR'\
-               'AMS='+player_season+'&ContextFilter=&ContextMeasure=FGA&DateFrom=&D'\
-               'ateTo=&GameID=&GameSegment=&LastNGames=0&LeagueID=00&Loca'\
-               'tion=&MeasureType=Base&Month=0&OpponentTeamID=0&Outcome=&'\
-               'PaceAdjust=N&PerMode=PerGame&Period=0&PlayerID='+player_id+'&Plu'\
-               'sMinus=N&PlayerPosition=&Rank=N&RookieYear=&Season='+player_season+'&Seas'\
-               'onSegment=&SeasonType=Regular+Season&TeamID=0&VsConferenc'\
-               'e=&VsDivision=&mode=Advanced&showDetails=0&showShots=1&sh'\
-               'owZones=0'
-
-# Get the webpage containing the data
-# print('a')
-response = requests.get(shot_chart_url, headers=header_data)
-# print('a')
-# Grab the headers to be used as column headers for our DataFrame
-headers = response.json()['resultSets'][0]['headers']
-# Grab the shot chart data
-shots = response.json()['resultSets'][0]['rowSet']
-
-# new_cols = 'PLAYER_ID','PLAYER_NAME','LOC_X','LOC_Y','SHOT_MADE_FLAG'
-# shot_df = pd.DataFrame(shots, columns=new_cols)
-shot_df = pd.DataFrame(shots, columns=headers)
+# Read the player's shots from the local league-wide shot store
+shot_df = shot_utils.load_shots(year, player_id=player_id)
 shot_df = shot_df[['PLAYER_ID','PLAYER_NAME','LOC_X','LOC_Y','SHOT_MADE_FLAG', 'GAME_ID']]
 # shot_df.to_csv('harden_test.csv')
 for x in range(0, len(shot_df)):
@@ -151,7 +117,7 @@ for x in range(0, len(shot_df)):
     if booler != True:
         print(booler)
 
-pic = urllib.request.urlretrieve("http://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/260x190/"+player_id+".png", player_id+".png")
+pic = shot_utils.get_headshot(player_id)
 
 cmap = plt.get_cmap('plasma_r')
 
@@ -175,7 +141,7 @@ ax.set_facecolor('wheat')
 # Add a title
 ax.set_title(player_name + ' Shot Chart', fontsize=16, loc='left')
 
-player_pic = plt.imread(pic[0])
+player_pic = plt.imread(pic)
 img = OffsetImage(player_pic, zoom=0.53)
 
 img.set_offset((800, 660))